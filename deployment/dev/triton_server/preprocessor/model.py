@@ -1,13 +1,18 @@
 import io
 
+import torch
+
 # triton_python_backend_utils is available in every Triton Python model. You
 # need to use this module to create inference requests and responses. It also
 # contains some utility functions for extracting information from model_config
 # and converting Triton input/output types to numpy types.
 import triton_python_backend_utils as pb_utils
+from torch.utils.dlpack import from_dlpack, to_dlpack
 from transformers import ViTImageProcessor
 
-from imageclassifier.features.image_preprocessor import execute_feature_extractor
+from imageclassifier.features.image_preprocessor import (
+    execute_feature_extractor_into,
+)
 
 
 class TritonPythonModel:
@@ -17,12 +22,22 @@ class TritonPythonModel:
         self.feature_extractor = ViTImageProcessor.from_pretrained(
             "google/vit-base-patch16-384"
         )
+        self.output_size = (
+            self.feature_extractor.size["height"],
+            self.feature_extractor.size["width"],
+        )
 
     def execute(self, requests):
         """`execute` is called once for every inference request. This function
         must be implemented by the model. The function receives a list of
         TritonPythonRequest objects when invoked. The function must return a
         list of TritonPythonResponse objects.
+
+        Tensors are exchanged with Triton through DLPack, so the input image is
+        read without copying and every preprocessed image is written into a
+        single output buffer allocated once per call. Resizing still
+        allocates one intermediate tensor per request, as `F.interpolate`
+        cannot write into an existing tensor.
         Parameters
         ----------
         requests : list of TritonPythonRequest
@@ -33,18 +48,28 @@ class TritonPythonModel:
         responses : list of TritonPythonResponse
           A list of TritonPythonResponse objects.
         """
-        responses = []
+        images = []
         for request in requests:
             in_0 = pb_utils.get_input_tensor_by_name(
                 request, "image_preprocessor_input"
             )
-            img = in_0.as_numpy()
-            transformed_img = execute_feature_extractor(self.feature_extractor, img)
-            out_tensor_0 = pb_utils.Tensor(
-                "image_preprocessor_output", transformed_img.astype("float32")
+            images.append(from_dlpack(in_0.to_dlpack()))
+
+        # Unbatched configs send [3, H, W], batchable ones [B, 3, H, W]
+        batch_sizes = [1 if img.dim() == 3 else img.shape[0] for img in images]
+        output_buffer = torch.empty(
+            (sum(batch_sizes), 3, *self.output_size), dtype=torch.float32
+        )
+        responses = []
+        for img, output in zip(
+            images, torch.split(output_buffer, batch_sizes)
+        ):
+            execute_feature_extractor_into(self.feature_extractor, img, output)
+            out_tensor_0 = pb_utils.Tensor.from_dlpack(
+                "image_preprocessor_output", to_dlpack(output)
             )
             inference_response = pb_utils.InferenceResponse(
                 output_tensors=[out_tensor_0]
             )
             responses.append(inference_response)
-        return responses
\ No newline at end of file
+        return responses
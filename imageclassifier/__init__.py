@@ -1,4 +1,10 @@
-from .client import run_inference
+from .client import MicroBatcher, run_inference, stream_inference
 from .model_repository_cli import create_model_repository, pbtxt_generator
 
-__all__ = ["create_model_repository", "pbtxt_generator", "run_inference"]
+__all__ = [
+    "MicroBatcher",
+    "create_model_repository",
+    "pbtxt_generator",
+    "run_inference",
+    "stream_inference",
+]
@@ -1,9 +1,20 @@
 import os
+from typing import Iterator
 
 import streamlit as st
 from PIL import Image
 
-from imageclassifier import run_inference
+from imageclassifier import MicroBatcher, stream_inference
+from imageclassifier.app.utils import (
+    PredictionCache,
+    batch_predictions,
+    classify_images,
+    downscale_image,
+    file_digest,
+    list_images,
+    save_upload,
+)
+from imageclassifier.transport import TransportPool
 
 # Define constants
 CLASSES = [
@@ -21,13 +32,116 @@ MODELS = {
         "output": "probabilities_output",
     },
 }
+# Used instead when the ensemble is served with the batchable configs of
+# deployment/dev/triton_server/bucketed
+BATCHED_MODELS = {
+    "ensemble_model": {
+        **MODELS["ensemble_model"],
+        "buckets": [(384, 384), (288, 512), (512, 288)],
+        "batched": True,
+    },
+}
 DEFAULT_SERVER_URL = os.getenv("INFERENCE_SERVER", "localhost:8000")
 MODEL_NAME = "ensemble_model"
 UPLOAD_FOLDER = "uploaded_images"
+THUMBNAIL_SIZE = (160, 160)
+PREVIEW_SIZE = (768, 768)
 
 # Ensure the upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+
+@st.cache_resource
+def get_transport_pool(server_url: str) -> TransportPool:
+    """Connections to the server, shared by all sessions and reruns."""
+    return TransportPool(server_url=server_url)
+
+
+@st.cache_data(ttl=60)
+def serves_batches(server_url: str) -> bool:
+    """Whether the model is served with a batchable config, checked every minute."""
+    with get_transport_pool(server_url).acquire() as transport:
+        return transport.model_max_batch_size(MODEL_NAME) > 0
+
+
+@st.cache_resource(validate=lambda batcher: not batcher.closed)
+def get_batcher(server_url: str) -> MicroBatcher:
+    """Batcher shared by all sessions, so concurrent requests are batched."""
+    return MicroBatcher(
+        MODEL_NAME, CLASSES, BATCHED_MODELS, server_url=server_url
+    )
+
+
+@st.cache_resource
+def get_prediction_cache(server_url: str) -> PredictionCache:
+    """Predictions of the images already classified by a server."""
+    return PredictionCache()
+
+
+@st.cache_data
+def list_folder_images(folder: str, folder_mtime_ns: int) -> list[str]:
+    """Image files of the folder, listed again only when the folder changes."""
+    return list_images(folder)
+
+
+@st.cache_data
+def cached_file_digest(path: str, mtime_ns: int) -> str:
+    """SHA-256 of a file, recomputed only when the file changes."""
+    return file_digest(path)
+
+
+@st.cache_data(max_entries=1000)
+def load_downscaled(path: str, mtime_ns: int, size: tuple[int, int]) -> bytes:
+    """Downscaled PNG of an image file, built the first time it is shown."""
+    return downscale_image(path, size)
+
+
+def predict(
+    images: Iterator[Image.Image], server_url: str
+) -> list[tuple[int, str]]:
+    """Batch the images when the server can, otherwise stream them over one connection."""
+    if serves_batches(server_url):
+        return batch_predictions(get_batcher(server_url), images)
+    with get_transport_pool(server_url).acquire() as transport:
+        return list(
+            stream_inference(
+                images, MODEL_NAME, CLASSES, MODELS, transport=transport
+            )
+        )
+
+
+def classify(paths: list[str], server_url: str) -> list[tuple[int, str]]:
+    """Predictions of image files, only the new ones are sent to the server."""
+    digests = [
+        cached_file_digest(path, os.stat(path).st_mtime_ns) for path in paths
+    ]
+    return classify_images(
+        paths,
+        digests,
+        get_prediction_cache(server_url),
+        lambda images: predict(images, server_url),
+    )
+
+
+def show_image(container, path: str, size: tuple[int, int], **kwargs) -> None:
+    """Display an image file downscaled, or a warning if it cannot be read."""
+    try:
+        image = load_downscaled(path, os.stat(path).st_mtime_ns, size)
+    except Exception as e:
+        container.warning(f"Cannot display {os.path.basename(path)}: {e}")
+        return
+    container.image(image, **kwargs)
+
+
+def show_prediction(predicted_class: str) -> None:
+    # Beautify the prediction display
+    st.markdown(
+        f"<div style='text-align: center; font-size: 1.5rem; color: white;'>"
+        f"<b>Predicted Class:</b> {predicted_class}</div>",
+        unsafe_allow_html=True,
+    )
+
+
 # Streamlit UI
 st.title("Image Classification with Triton Inference Server")
 
@@ -42,52 +156,63 @@ uploaded_image = st.file_uploader(
 )
 
 # Option to select an image from a folder
-folder_images = [
-    f
-    for f in os.listdir(UPLOAD_FOLDER)
-    if os.path.isfile(os.path.join(UPLOAD_FOLDER, f))
-]
+folder_images = list_folder_images(
+    UPLOAD_FOLDER, os.stat(UPLOAD_FOLDER).st_mtime_ns
+)
 selected_image = st.selectbox(
     "Or select an image from the folder:", [""] + folder_images
 )
 
-# Determine the image to use
-image_to_use = None
+# Determine the image to use, it is only read and decoded on demand
+image_path = None
 if uploaded_image:
-    image = Image.open(uploaded_image)
-    image_to_use = image
-    # Save uploaded image to the folder
-    image_path = os.path.join(UPLOAD_FOLDER, uploaded_image.name)
-    image.save(image_path)
-    st.image(image, caption="Uploaded Image", use_container_width=True)
+    # Save uploaded image to the folder, as is and only when it changed
+    image_path = save_upload(
+        UPLOAD_FOLDER, uploaded_image.name, uploaded_image.getvalue()
+    )
+    caption = "Uploaded Image"
 elif selected_image:
     image_path = os.path.join(UPLOAD_FOLDER, selected_image)
-    image = Image.open(image_path)
-    image_to_use = image
-    st.image(image, caption="Selected Image", use_container_width=True)
+    caption = "Selected Image"
+
+if image_path:
+    show_image(
+        st, image_path, PREVIEW_SIZE, caption=caption, use_container_width=True
+    )
 
 # Perform inference when an image is selected
 if st.button("Classify Image"):
-    if image_to_use:
+    if image_path:
         try:
             with st.spinner("Running inference..."):
-                # Call inference function
-                predicted_index, predicted_class = run_inference(
-                    image=image_to_use,
-                    model_name=MODEL_NAME,
-                    classes=CLASSES,
-                    models=MODELS,
-                    server_url=server_url,
-                )
-            # Beautify the prediction display
-            st.markdown(
-                f"<div style='text-align: center; font-size: 1.5rem; color: white;'>"
-                f"<b>Predicted Class:</b> {predicted_class}</div>",
-                unsafe_allow_html=True,
-            )
+                [(_, predicted_class)] = classify([image_path], server_url)
+            show_prediction(predicted_class)
         except Exception as e:
             st.error(f"Error during inference: {e}")
     else:
         st.warning(
             "Please upload or select an image before running inference."
         )
+
+# Classify every image of the folder in one go
+if st.button("Classify All Images in Folder"):
+    if folder_images:
+        paths = [os.path.join(UPLOAD_FOLDER, f) for f in folder_images]
+        try:
+            with st.spinner(f"Classifying {len(paths)} images..."):
+                predictions = classify(paths, server_url)
+        except Exception as e:
+            st.error(f"Error during inference: {e}")
+        else:
+            columns = st.columns(4)
+            for idx, (path, (_, predicted_class)) in enumerate(
+                zip(paths, predictions)
+            ):
+                show_image(
+                    columns[idx % len(columns)],
+                    path,
+                    THUMBNAIL_SIZE,
+                    caption=f"{os.path.basename(path)}: {predicted_class}",
+                )
+    else:
+        st.warning("There are no images in the folder to classify.")
@@ -0,0 +1,173 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, Sequence
+
+from PIL import Image
+
+from imageclassifier import MicroBatcher
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of predictions keyed by the hash of the image.
+
+    Args:
+        max_entries (int, optional): Maximum number of predictions kept. Defaults to 10000.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        self._predictions: OrderedDict[str, tuple[int, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._predictions)
+
+    def get(self, image_digest: str) -> tuple[int, str] | None:
+        """Return the prediction of an image, None when it is not cached."""
+        with self._lock:
+            prediction = self._predictions.get(image_digest)
+            if prediction is not None:
+                self._predictions.move_to_end(image_digest)
+            return prediction
+
+    def put(self, image_digest: str, prediction: tuple[int, str]) -> None:
+        """Store a prediction, evicting the least recently used one when full."""
+        with self._lock:
+            self._predictions[image_digest] = prediction
+            self._predictions.move_to_end(image_digest)
+            while len(self._predictions) > self.max_entries:
+                self._predictions.popitem(last=False)
+
+
+def list_images(folder: str) -> list[str]:
+    """Sorted names of the image files of a folder."""
+    return sorted(
+        f
+        for f in os.listdir(folder)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+        and os.path.isfile(os.path.join(folder, f))
+    )
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def save_upload(folder: str, name: str, content: bytes) -> str:
+    """
+    Save an uploaded file to a folder, as is and only when its content changed.
+
+    Args:
+        folder (str): Folder to save the file to.
+        name (str): Name of the uploaded file, any directory part is dropped.
+        content (bytes): Content of the uploaded file.
+
+    return:
+        str: Path of the saved file.
+    """
+    path = os.path.join(folder, os.path.basename(name))
+    if (
+        not os.path.exists(path)
+        or file_digest(path) != hashlib.sha256(content).hexdigest()
+    ):
+        with open(path, "wb") as f:
+            f.write(content)
+    return path
+
+
+def downscale_image(path: str, size: tuple[int, int]) -> bytes:
+    """
+    Downscaled PNG of an image file, to display it without sending the original.
+
+    Images in modes PNG cannot store, such as CMYK JPEGs, are converted to RGB.
+
+    Args:
+        path (str): Path of the image file.
+        size (tuple[int, int]): Maximum width and height, the aspect ratio is kept.
+
+    return:
+        bytes: PNG encoded image.
+    """
+    with Image.open(path) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        image.thumbnail(size)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def batch_predictions(
+    batcher: MicroBatcher, images: Iterable[Image.Image]
+) -> list[tuple[int, str]]:
+    """
+    Predict several images with a batcher, submitting all of them before waiting.
+
+    Args:
+        batcher (MicroBatcher): Batcher of the model to classify the images with.
+        images (Iterable[Image.Image]): Images to classify.
+
+    return:
+        list[tuple[int, str]]: Index and class name of the prediction of each image.
+    """
+    futures = [batcher.submit(image) for image in images]
+    return [future.result() for future in futures]
+
+
+def classify_images(
+    paths: Sequence[str],
+    image_digests: Sequence[str],
+    cache: PredictionCache,
+    predict: Callable[[Iterator[Image.Image]], Iterable[tuple[int, str]]],
+) -> list[tuple[int, str]]:
+    """
+    Classify image files, sending only the images without a cached prediction.
+
+    The uncached images are handed to `predict` together, so it can send them
+    to the server in batches or over one stream. Files with the same content
+    are sent once.
+
+    Args:
+        paths (Sequence[str]): Paths of the image files.
+        image_digests (Sequence[str]): Hash of each file, used as cache key.
+        cache (PredictionCache): Predictions of the images already classified.
+        predict (Callable): Returns the index and class name of the prediction
+            of each image it is given, in order.
+
+    return:
+        list[tuple[int, str]]: Index and class name of the prediction of each image.
+    """
+    predictions = {}
+    uncached = {}
+    for path, image_digest in zip(paths, image_digests):
+        if image_digest in predictions or image_digest in uncached:
+            continue
+        prediction = cache.get(image_digest)
+        if prediction is not None:
+            predictions[image_digest] = prediction
+        else:
+            uncached[image_digest] = path
+
+    def images() -> Iterator[Image.Image]:
+        # Images are decoded one at a time, as `predict` consumes them
+        for path in uncached.values():
+            with Image.open(path) as image:
+                yield image.convert("RGB")
+
+    if uncached:
+        for image_digest, (predicted_index, predicted_class) in zip(
+            uncached, predict(images()), strict=True
+        ):
+            predictions[image_digest] = (int(predicted_index), predicted_class)
+            cache.put(image_digest, predictions[image_digest])
+    return [predictions[image_digest] for image_digest in image_digests]
@@ -1,15 +1,119 @@
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Iterable, Iterator, Sequence
+
 import numpy as np
-import tritonclient.http as httpclient
-from PIL import ImageFile
+from PIL import Image, ImageFile, ImageOps
 from torchvision import transforms
 
+from .transport import TRANSPORTS, InferenceTransport, create_transport
+
+# Sentinel placed on the micro-batcher queue to stop the worker thread.
+_STOP = object()
+
+
+def select_bucket(
+    height: int, width: int, buckets: Sequence[Sequence[int]]
+) -> tuple[int, int]:
+    """
+    Pick the bucket whose aspect ratio is closest to the image's.
+
+    Args:
+        height (int): Image height.
+        width (int): Image width.
+        buckets (Sequence[Sequence[int]]): Candidate `(height, width)` bucket shapes.
+
+    Raises:
+        ValueError: If no buckets are given.
+    return:
+        Tuple[int, int]: Height and width of the selected bucket.
+    """
+    if not buckets:
+        raise ValueError("At least one bucket shape is required.")
+    aspect_ratio = math.log(width / height)
+    bucket_height, bucket_width = min(
+        buckets,
+        key=lambda bucket: abs(math.log(bucket[1] / bucket[0]) - aspect_ratio),
+    )
+    return bucket_height, bucket_width
+
+
+def bucket_image(
+    image: ImageFile.ImageFile,
+    buckets: Sequence[Sequence[int]],
+    mode: str = "resize",
+) -> Image.Image:
+    """
+    Fit an image into one of a few fixed shapes so requests can be batched.
+
+    Args:
+        image(ImageFile.ImageFile): input image file.
+        buckets (Sequence[Sequence[int]]): Candidate `(height, width)` bucket shapes.
+        mode (str, optional): "resize" stretches the image to the bucket,
+            "letterbox" keeps its aspect ratio and pads with black. Defaults to "resize".
+
+    Raises:
+        ValueError: If the mode is not supported.
+    return:
+        Image.Image: Image with the selected bucket shape.
+    """
+    height, width = select_bucket(image.height, image.width, buckets)
+    if mode == "resize":
+        return image.resize((width, height), Image.Resampling.BILINEAR)
+    if mode == "letterbox":
+        return ImageOps.pad(
+            image, (width, height), Image.Resampling.BILINEAR, color=0
+        )
+    raise ValueError(
+        f"Unsupported bucket mode '{mode}', use 'resize' or 'letterbox'."
+    )
+
+
+def _preprocess_image(
+    image: ImageFile.ImageFile, config: dict[str, Any] | None = None
+) -> np.ndarray:
+    """Convert a PIL image into a CHW float32 numpy array."""
+    if config and config.get("buckets"):
+        image = bucket_image(
+            image, config["buckets"], config.get("bucket_mode", "resize")
+        )
+    preprocess = transforms.Compose([transforms.ToTensor()])
+    return preprocess(image).numpy()
+
+
+def _image_tensor(
+    image: ImageFile.ImageFile, config: dict[str, Any]
+) -> np.ndarray:
+    """Build the request tensor of a single image for a model."""
+    numpy_image = _preprocess_image(image, config)
+    # Models served with max_batch_size expect a leading batch dimension
+    if config.get("batched"):
+        numpy_image = numpy_image[np.newaxis]
+    return numpy_image
+
+
+def _use_transport(
+    transport: InferenceTransport | None,
+    protocol: str,
+    server_url: str | None,
+):
+    """Reuse the caller's transport, or open one for the duration of a call."""
+    if transport is not None:
+        return nullcontext(transport)
+    return create_transport(protocol, server_url)
+
 
 def run_inference(
     image: ImageFile.ImageFile,
     model_name: str,
     classes: list[str],
     models: dict[str, dict[str, str]],
-    server_url: str = "localhost:8000",
+    server_url: str | None = None,
+    protocol: str = "http",
 ) -> tuple[str, str]:
     """
     Runs inference on a given image using the specified model on the Triton Inference Server.
@@ -19,7 +123,13 @@ def run_inference(
         model_name (str): Name of the model to use for inference.
         classes (List[str]): List of class names for prediction output.
         models (Dict[str, Dict[str, str]]): Configuration for models with input and output mappings.
-        server_url (str, optional): URL of the Triton Inference Server. Defaults to "localhost:8000".
+            A model may also list `buckets` of `(height, width)` shapes, and a
+            `bucket_mode`, to fit the image to a bucket, and set `batched`
+            when it is served with a batchable config (`max_batch_size` > 0),
+            to send the image with a leading batch dimension.
+        server_url (str, optional): URL of the Triton Inference Server.
+            Defaults to "localhost:8000" for HTTP and "localhost:8001" for gRPC.
+        protocol (str, optional): Transport to use, "http" or "grpc". Defaults to "http".
 
     Raises:
         ValueError: If the specified model is not found in the models configuration.
@@ -32,23 +142,320 @@ def run_inference(
         )
 
     # Load and preprocess the image
-    preprocess = transforms.Compose([transforms.ToTensor()])
-    numpy_image = preprocess(image).numpy()
-
-    # Configure model input and output
     config = models[model_name]
-    inputs = httpclient.InferInput(
-        config["input"], numpy_image.shape, datatype="FP32"
-    )
-    inputs.set_data_from_numpy(numpy_image, binary_data=True)
+    numpy_image = _image_tensor(image, config)
 
     # Perform inference
-    with httpclient.InferenceServerClient(server_url) as client:
-        response = client.infer(model_name, [inputs])
-        output = response.as_numpy(config["output"])
+    with create_transport(protocol, server_url) as transport:
+        output = transport.infer(
+            model_name, config["input"], numpy_image, config["output"]
+        )
 
     # Display results
     predicted_index = np.argmax(output[0])
     predicted_class = classes[predicted_index]
 
     return predicted_index, predicted_class
+
+
+def stream_inference(
+    images: Iterable[ImageFile.ImageFile],
+    model_name: str,
+    classes: list[str],
+    models: dict[str, dict[str, str]],
+    server_url: str | None = None,
+    protocol: str = "http",
+    transport: InferenceTransport | None = None,
+) -> Iterator[tuple[str, str]]:
+    """
+    Runs inference on several images over one connection, yielding each result in order.
+
+    With gRPC all requests share one bidirectional stream; with HTTP they are
+    sent one after the other over a single connection.
+
+    Args:
+        images (Iterable[ImageFile.ImageFile]): input image files.
+        model_name (str): Name of the model to use for inference.
+        classes (List[str]): List of class names for prediction output.
+        models (Dict[str, Dict[str, str]]): Configuration for models with input and output mappings.
+        server_url (str, optional): URL of the Triton Inference Server.
+            Defaults to "localhost:8000" for HTTP and "localhost:8001" for gRPC.
+        protocol (str, optional): Transport to use, "http" or "grpc". Defaults to "http".
+        transport (InferenceTransport, optional): Open transport to reuse instead of
+            connecting to `server_url` with `protocol`. It is left open.
+
+    Raises:
+        ValueError: If the specified model is not found in the models configuration.
+    return:
+        Iterator[Tuple[str, str]]: Index and class name of the predicted output of each image.
+    """
+    if model_name not in models:
+        raise ValueError(
+            f"Model '{model_name}' not found in the provided models configuration."
+        )
+
+    config = models[model_name]
+    tensors = (_image_tensor(image, config) for image in images)
+    with _use_transport(transport, protocol, server_url) as transport:
+        for output in transport.stream_infer(
+            model_name, config["input"], tensors, config["output"]
+        ):
+            predicted_index = np.argmax(output[0])
+            yield predicted_index, classes[predicted_index]
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-image inference calls into batched requests.
+
+    Callers submit one image at a time from any thread. A background worker
+    collects the queued images and flushes them as one request when either
+    `max_batch_size` images are waiting or `max_wait_us` microseconds have
+    passed since the first image of the batch arrived. Images are stacked
+    along a new leading batch dimension, so the model must be served with a
+    batchable config (`max_batch_size` > 0), such as the ones in
+    `deployment/dev/triton_server/bucketed`; this is checked against the
+    server on start, and `max_batch_size` is capped to the model's. Images
+    with different shapes are sent as separate requests within the same
+    flush, so configure `buckets` for the model to make them share requests.
+
+    Example:
+        MODELS = {
+            "ensemble_model": {
+                "input": "input_image",
+                "output": "probabilities_output",
+                "buckets": [(384, 384), (288, 512), (512, 288)],
+            },
+        }
+        with MicroBatcher("ensemble_model", CLASSES, MODELS) as batcher:
+            predicted_index, predicted_class = batcher.run_inference(image)
+
+    Args:
+        model_name (str): Name of the model to use for inference.
+        classes (List[str]): List of class names for prediction output.
+        models (Dict[str, Dict[str, str]]): Configuration for models with input and output mappings.
+        server_url (str, optional): URL of the Triton Inference Server.
+            Defaults to "localhost:8000" for HTTP and "localhost:8001" for gRPC.
+        protocol (str, optional): Transport to use, "http" or "grpc". Defaults to "http".
+        max_batch_size (int, optional): Maximum number of images per request. Defaults to 8.
+        max_wait_us (int, optional): Maximum time in microseconds to wait for a batch to fill. Defaults to 1000.
+
+    Raises:
+        ValueError: If the specified model is not found in the models configuration,
+            if `protocol`, `max_batch_size` or `max_wait_us` are not valid,
+            or if the served model does not support batching.
+        Exception: Any error raised while connecting to the server.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        classes: list[str],
+        models: dict[str, dict[str, str]],
+        server_url: str | None = None,
+        protocol: str = "http",
+        max_batch_size: int = 8,
+        max_wait_us: int = 1000,
+    ):
+        if model_name not in models:
+            raise ValueError(
+                f"Model '{model_name}' not found in the provided models configuration."
+            )
+        if protocol not in TRANSPORTS:
+            raise ValueError(
+                f"Unsupported protocol '{protocol}', use one of {sorted(TRANSPORTS)}."
+            )
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        if max_wait_us < 0:
+            raise ValueError("max_wait_us must not be negative.")
+
+        self.model_name = model_name
+        self.classes = classes
+        self.config = models[model_name]
+        self.server_url = server_url
+        self.protocol = protocol
+        self.max_batch_size = max_batch_size
+        self.max_wait_us = max_wait_us
+
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Set when the worker stopped because of an error
+        self._error: BaseException | None = None
+        self._started = threading.Event()
+        self._worker = threading.Thread(
+            target=self._run, name="imageclassifier-microbatcher", daemon=True
+        )
+        self._worker.start()
+
+        # Surface connection and batch capability errors to the caller
+        self._started.wait()
+        if self._error is not None:
+            self._worker.join()
+            raise self._error
+
+    def __enter__(self) -> "MicroBatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def submit(self, image: ImageFile.ImageFile) -> Future:
+        """
+        Queue an image for inference.
+
+        The image is converted to a tensor in the calling thread, so
+        preprocessing of concurrent calls runs in parallel.
+
+        Args:
+            image(ImageFile.ImageFile): input image file.
+
+        Raises:
+            RuntimeError: If the batcher has been closed or its worker failed.
+        return:
+            Future: Resolves to the index and class name of the predicted output.
+        """
+        numpy_image = _preprocess_image(image, self.config)
+        future: Future = Future()
+        with self._lock:
+            if self._error is not None:
+                raise RuntimeError(
+                    f"MicroBatcher worker failed: {self._error}"
+                ) from self._error
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._queue.put((numpy_image, future))
+        return future
+
+    def run_inference(self, image: ImageFile.ImageFile) -> tuple[str, str]:
+        """
+        Run inference on a single image, blocking until its batch is served.
+
+        Args:
+            image(ImageFile.ImageFile): input image file.
+
+        return:
+            Tuple[str, str]: Index and class name of the predicted output.
+        """
+        return self.submit(image).result()
+
+    def close(self) -> None:
+        """Flush pending images and stop the background worker."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join()
+
+    @property
+    def closed(self) -> bool:
+        """Whether images are rejected, after `close` or a worker failure."""
+        return self._closed
+
+    def _run(self) -> None:
+        try:
+            transport = create_transport(self.protocol, self.server_url)
+            try:
+                self._check_batching(transport)
+            except BaseException:
+                transport.close()
+                raise
+        except BaseException as e:
+            self._fail(e)
+            self._started.set()
+            return
+        self._started.set()
+
+        batch: list[tuple[np.ndarray, Future]] = []
+        try:
+            with transport:
+                stop = False
+                while not stop:
+                    item = self._queue.get()
+                    if item is _STOP:
+                        break
+                    batch = [item]
+                    deadline = time.monotonic() + self.max_wait_us / 1_000_000
+                    while len(batch) < self.max_batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = self._queue.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                        if item is _STOP:
+                            stop = True
+                            break
+                        batch.append(item)
+                    self._flush(transport, batch)
+                    batch = []
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            self._fail(e)
+
+    def _check_batching(self, transport: InferenceTransport) -> None:
+        server_max_batch_size = transport.model_max_batch_size(self.model_name)
+        if server_max_batch_size < 1:
+            raise ValueError(
+                f"Model '{self.model_name}' does not support batching, serve "
+                "it with a config setting max_batch_size."
+            )
+        self.max_batch_size = min(self.max_batch_size, server_max_batch_size)
+
+    def _fail(self, error: BaseException) -> None:
+        """Reject queued and future images after the worker failed."""
+        with self._lock:
+            self._error = error
+            self._closed = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[1].set_exception(error)
+
+    def _flush(
+        self,
+        transport: InferenceTransport,
+        batch: list[tuple[np.ndarray, Future]],
+    ) -> None:
+        # Only images of identical shape can be stacked into one tensor
+        groups: dict[tuple[int, ...], list[tuple[np.ndarray, Future]]] = {}
+        for numpy_image, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(numpy_image.shape, []).append(
+                    (numpy_image, future)
+                )
+
+        for group in groups.values():
+            futures = [future for _, future in group]
+            try:
+                batched_image = np.stack([image for image, _ in group])
+                output = transport.infer(
+                    self.model_name,
+                    self.config["input"],
+                    batched_image,
+                    self.config["output"],
+                )
+                # A short output would leave the remaining futures unresolved
+                if len(output) != len(futures):
+                    raise ValueError(
+                        f"Model '{self.model_name}' returned {len(output)} "
+                        f"outputs for a batch of {len(futures)} images."
+                    )
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, probabilities in zip(futures, output):
+                predicted_index = np.argmax(probabilities)
+                future.set_result(
+                    (predicted_index, self.classes[predicted_index])
+                )
@@ -1,6 +1,8 @@
-from typing import Any
+from typing import Any, List, Optional
 
 import numpy as np
+import torch
+import torch.nn.functional as F
 
 
 def execute_feature_extractor(
@@ -9,3 +11,89 @@ def execute_feature_extractor(
     inputs = feature_extractor(images=image, return_tensors="pt")
     transformed_img = inputs.pixel_values.cpu().numpy()
     return transformed_img
+
+
+def preprocess_tensor(
+    image: torch.Tensor,
+    size: List[int],
+    mean: torch.Tensor,
+    std: torch.Tensor,
+    rescale_factor: float,
+    out: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    """
+    Resize, rescale and normalize images like a ViT image processor.
+
+    Shared by the `image_preprocessor` Python model and the TorchScript graph
+    of the fused model, so both serve the same preprocessing. It is
+    scriptable, and writes into `out` when given; the resized images are
+    still allocated as an intermediate tensor.
+
+    Args:
+        image: `[3, H, W]` or `[B, 3, H, W]` image tensor.
+        size: Height and width the images are resized to.
+        mean: Per-channel normalization mean.
+        std: Per-channel normalization standard deviation.
+        rescale_factor: Factor applied to pixel values before normalization.
+        out: Optional `[B, 3, height, width]` tensor receiving the result.
+
+    return:
+        torch.Tensor: The preprocessed images, `out` when given.
+    """
+    if image.dim() == 3:
+        image = image.unsqueeze(0)
+    if out is None:
+        out = torch.empty(
+            [image.shape[0], image.shape[1], size[0], size[1]],
+            dtype=image.dtype,
+            device=image.device,
+        )
+    # No copy when the input already has the output dtype
+    image = image.to(dtype=out.dtype)
+
+    resized = F.interpolate(
+        image,
+        size=size,
+        mode="bilinear",
+        align_corners=False,
+        antialias=True,
+    )
+    torch.mul(resized, rescale_factor, out=out)
+    out.sub_(mean.view(1, -1, 1, 1)).div_(std.view(1, -1, 1, 1))
+    return out
+
+
+def execute_feature_extractor_into(
+    feature_extractor: Any, image: torch.Tensor, out: torch.Tensor
+) -> torch.Tensor:
+    """
+    Preprocess an image with torch ops into a preallocated output tensor.
+
+    Applies `preprocess_tensor` with the parameters of a ViT image processor,
+    without its numpy and PIL round trips, so a DLPack view of the request
+    tensor can be passed in and the result written in place.
+
+    Args:
+        feature_extractor: ViT image processor providing the preprocessing parameters.
+        image: `[3, H, W]` or `[B, 3, H, W]` image tensor.
+        out: `[B, 3, height, width]` tensor receiving the preprocessed image.
+
+    return:
+        torch.Tensor: `out`, filled with the preprocessed image.
+    """
+    if feature_extractor.do_normalize:
+        mean = feature_extractor.image_mean
+        std = feature_extractor.image_std
+    else:
+        mean, std = [0.0], [1.0]
+    rescale_factor = (
+        feature_extractor.rescale_factor if feature_extractor.do_rescale else 1
+    )
+    return preprocess_tensor(
+        image,
+        list(out.shape[-2:]),
+        torch.as_tensor(mean, dtype=out.dtype, device=out.device),
+        torch.as_tensor(std, dtype=out.dtype, device=out.device),
+        float(rescale_factor),
+        out,
+    )
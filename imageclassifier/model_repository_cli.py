@@ -8,6 +8,59 @@ import click
 import timm
 import torch
 
+from imageclassifier.features.image_preprocessor import preprocess_tensor
+
+# Preprocessing constants of the "google/vit-base-patch16-384" ViTImageProcessor
+VIT_IMAGE_SIZE = 384
+VIT_IMAGE_MEAN = (0.5, 0.5, 0.5)
+VIT_IMAGE_STD = (0.5, 0.5, 0.5)
+VIT_RESCALE_FACTOR = 1 / 255
+
+
+class FusedImageClassifier(torch.nn.Module):
+    """
+    Wraps a classifier with torch-native preprocessing matching the ViT processor.
+
+    The module resizes the image with antialiased bilinear interpolation,
+    rescales and normalizes it with the same `preprocess_tensor` as the
+    `image_preprocessor` Python model, and then runs the classifier. Serving
+    it as a single PyTorch model removes the ensemble hop and the Python
+    backend between both steps.
+
+    Args:
+        model: Classifier expecting `[-1, 3, image_size, image_size]` inputs.
+        image_size: Height and width the image is resized to.
+        mean: Per-channel normalization mean.
+        std: Per-channel normalization standard deviation.
+        rescale_factor: Factor applied to pixel values before normalization.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        image_size: int = VIT_IMAGE_SIZE,
+        mean: tuple[float, float, float] = VIT_IMAGE_MEAN,
+        std: tuple[float, float, float] = VIT_IMAGE_STD,
+        rescale_factor: float = VIT_RESCALE_FACTOR,
+    ):
+        super().__init__()
+        self.model = model
+        self.image_size = image_size
+        self.rescale_factor = rescale_factor
+        self.register_buffer("mean", torch.tensor(mean).view(1, 3, 1, 1))
+        self.register_buffer("std", torch.tensor(std).view(1, 3, 1, 1))
+
+    def forward(self, input_image: torch.Tensor) -> torch.Tensor:
+        # Also accepts a single [3, H, W] image as sent to the ensemble
+        features = preprocess_tensor(
+            input_image,
+            [self.image_size, self.image_size],
+            self.mean,
+            self.std,
+            self.rescale_factor,
+        )
+        return self.model(features)
+
 
 def generate_ensemble_config(
     ensemble_steps: list[dict[str, any]],
@@ -58,6 +111,61 @@ def generate_ensemble_config(
     return "\n".join(config_lines)
 
 
+def format_pbtxt_value(value: Any) -> str:
+    """
+    Format a scalar or a list of scalars as a protobuf text format value.
+
+    Strings are written unquoted, as enum values such as `REJECT`.
+
+    Args:
+        value: Boolean, number, enum name, or list of those.
+
+    Raises:
+        ValueError: If the value cannot be written as a scalar field.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str) and re.fullmatch(
+        r"[A-Za-z_][A-Za-z0-9_]*", value
+    ):
+        return value
+    if isinstance(value, list):
+        return f"[{', '.join(format_pbtxt_value(item) for item in value)}]"
+    raise ValueError(f"Unsupported config value {value!r}")
+
+
+def format_pbtxt_field(key: str, value: Any, indent: int = 0) -> list[str]:
+    """
+    Format a config field as protobuf text format lines.
+
+    Dictionaries become nested messages, everything else a scalar field.
+
+    Args:
+        key: Field name.
+        value: Field value.
+        indent: Nesting level of the field.
+
+    Raises:
+        ValueError: If a value or a message key is not supported.
+    """
+    padding = "  " * indent
+    if not isinstance(value, dict):
+        return [f"{padding}{key}: {format_pbtxt_value(value)}"]
+
+    lines = [f"{padding}{key} {{"]
+    for field, field_value in value.items():
+        if not isinstance(field, str):
+            raise ValueError(
+                f"Unsupported key {field!r} in '{key}', only message fields "
+                "are supported"
+            )
+        lines.extend(format_pbtxt_field(field, field_value, indent + 1))
+    lines.append(f"{padding}}}")
+    return lines
+
+
 def create_model_repository(
     model_name: str,
     version: int,
@@ -72,7 +180,8 @@ def create_model_repository(
         model_name: Name of the model
         version: Model version number
         backend: Backend to use (e.g. "pytorch", "onnx", etc)
-        config: Dictionary containing input and output tensor configurations
+        config: Dictionary containing input and output tensor configurations,
+            optionally with "max_batch_size" and "dynamic_batching" settings
         base_path: Base path for model repository
     """
     # Create directory structure, check if the version already exists, if then increment the version +1 of the last version available
@@ -86,7 +195,11 @@ def create_model_repository(
     # Create config.pbtxt content
     config_content = f"""name: "{model_name}"
 backend: "{backend}"
-input [
+"""
+    # Batchable models declare dims without the batch dimension
+    if "max_batch_size" in config:
+        config_content += f"max_batch_size: {config['max_batch_size']}\n"
+    config_content += f"""input [
   {{
     name: "{config['input']['name']}"
     data_type: {config['input']['data_type']}
@@ -101,6 +214,12 @@ output [
   }}
 ]
 """
+    if "dynamic_batching" in config:
+        config_content += "\n".join(
+            format_pbtxt_field("dynamic_batching", config["dynamic_batching"])
+        )
+        config_content += "\n"
+
     # Check for ensemble_steps in the config
     if "ensemble_steps" in config and isinstance(
         config["ensemble_steps"], list
@@ -181,14 +300,34 @@ def create_repository(
     default="model_repository",
     help="Base path of model repository",
 )
-def download_model(model_name: str, base_path: str = "model_repository"):
+@click.option(
+    "--fused",
+    is_flag=True,
+    default=False,
+    help="Bake the ViT preprocessing into the exported TorchScript graph",
+)
+@click.option(
+    "--source-model",
+    default=None,
+    help="timm model to download, defaults to MODEL_NAME",
+)
+def download_model(
+    model_name: str,
+    base_path: str = "model_repository",
+    fused: bool = False,
+    source_model: str | None = None,
+):
     """
     Download a pretrained model from timm and save it to the model repository.
     The model will be saved in the highest version number directory found.
     If no version exists, it will create version 1.
 
+    With --fused the exported model takes raw `[3, H, W]` images and resizes
+    and normalizes them itself, so it can be served without the ensemble.
+
     Example usage:
     python imageclassifier/model_repository_cli.py download-model vit_base_patch16_384
+    python imageclassifier/model_repository_cli.py download-model fused_classifier --fused --source-model vit_base_patch16_384
     """
     try:
         # Find the model base directory
@@ -222,10 +361,16 @@ def download_model(model_name: str, base_path: str = "model_repository"):
             return
 
         # Create and configure the model
-        model = timm.create_model(model_name, pretrained=True, num_classes=7)
+        model = timm.create_model(
+            source_model or model_name, pretrained=True, num_classes=7
+        )
+        model.eval()
         # Save model state dict
         model_file = model_path / "model.pt"
         traced_model = torch.jit.trace(model, torch.randn(1, 3, 384, 384))
+        if fused:
+            # Script the wrapper so the optional batch dimension stays dynamic
+            traced_model = torch.jit.script(FusedImageClassifier(traced_model))
         torch.jit.save(traced_model, model_file)
 
         click.echo(
@@ -0,0 +1,318 @@
+import queue
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+import numpy as np
+import tritonclient.grpc as grpcclient
+import tritonclient.http as httpclient
+
+DEFAULT_SERVER_URLS = {"http": "localhost:8000", "grpc": "localhost:8001"}
+
+
+class InferenceTransport(ABC):
+    """
+    Protocol used to send tensors to the Triton Inference Server.
+
+    Subclasses wrap one tritonclient protocol behind the same calls, so the
+    client code can switch between HTTP and gRPC per deployment.
+    """
+
+    def __enter__(self) -> "InferenceTransport":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @abstractmethod
+    def infer(
+        self,
+        model_name: str,
+        input_name: str,
+        data: np.ndarray,
+        output_name: str,
+    ) -> np.ndarray:
+        """
+        Send one FP32 tensor to a model and return the requested output.
+
+        Args:
+            model_name (str): Name of the model to use for inference.
+            input_name (str): Name of the model input.
+            data (np.ndarray): Input tensor.
+            output_name (str): Name of the model output.
+
+        return:
+            np.ndarray: Output tensor.
+        """
+
+    @abstractmethod
+    def model_max_batch_size(self, model_name: str) -> int:
+        """
+        Return the `max_batch_size` a model is served with, 0 if it does not batch.
+
+        Args:
+            model_name (str): Name of the model.
+        """
+
+    def stream_infer(
+        self,
+        model_name: str,
+        input_name: str,
+        tensors: Iterable[np.ndarray],
+        output_name: str,
+    ) -> Iterator[np.ndarray]:
+        """
+        Send several tensors and yield their outputs in order.
+
+        The default implementation sends one request after the other;
+        transports with a streaming API override it.
+
+        Args:
+            model_name (str): Name of the model to use for inference.
+            input_name (str): Name of the model input.
+            tensors (Iterable[np.ndarray]): Input tensors, one per request.
+            output_name (str): Name of the model output.
+
+        return:
+            Iterator[np.ndarray]: Output tensor of each request.
+        """
+        for data in tensors:
+            yield self.infer(model_name, input_name, data, output_name)
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release the connection to the server."""
+
+
+class HttpTransport(InferenceTransport):
+    """
+    Transport over the KServe v2 HTTP/REST protocol with binary tensor data.
+
+    Args:
+        server_url (str, optional): URL of the Triton Inference Server. Defaults to "localhost:8000".
+    """
+
+    def __init__(self, server_url: str = DEFAULT_SERVER_URLS["http"]):
+        self._client = httpclient.InferenceServerClient(server_url)
+
+    def infer(
+        self,
+        model_name: str,
+        input_name: str,
+        data: np.ndarray,
+        output_name: str,
+    ) -> np.ndarray:
+        inputs = httpclient.InferInput(
+            input_name, list(data.shape), datatype="FP32"
+        )
+        inputs.set_data_from_numpy(data, binary_data=True)
+        response = self._client.infer(model_name, [inputs])
+        return response.as_numpy(output_name)
+
+    def model_max_batch_size(self, model_name: str) -> int:
+        config = self._client.get_model_config(model_name)
+        return int(config.get("max_batch_size", 0))
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class GrpcTransport(InferenceTransport):
+    """
+    Transport over the KServe v2 gRPC protocol.
+
+    Tensors travel as raw protobuf contents over HTTP/2, and `stream_infer`
+    uses a single bidirectional stream for all requests, yielding results
+    while later requests are still being sent.
+
+    Args:
+        server_url (str, optional): URL of the Triton Inference Server. Defaults to "localhost:8001".
+        max_in_flight (int, optional): Maximum number of streamed requests
+            awaiting their result. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        server_url: str = DEFAULT_SERVER_URLS["grpc"],
+        max_in_flight: int = 8,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self.max_in_flight = max_in_flight
+        self._client = grpcclient.InferenceServerClient(server_url)
+
+    @staticmethod
+    def _inputs(input_name: str, data: np.ndarray) -> list:
+        inputs = grpcclient.InferInput(
+            input_name, list(data.shape), datatype="FP32"
+        )
+        inputs.set_data_from_numpy(data)
+        return [inputs]
+
+    def infer(
+        self,
+        model_name: str,
+        input_name: str,
+        data: np.ndarray,
+        output_name: str,
+    ) -> np.ndarray:
+        response = self._client.infer(
+            model_name, self._inputs(input_name, data)
+        )
+        return response.as_numpy(output_name)
+
+    def model_max_batch_size(self, model_name: str) -> int:
+        config = self._client.get_model_config(model_name, as_json=True)
+        return int(config["config"].get("max_batch_size", 0))
+
+    def stream_infer(
+        self,
+        model_name: str,
+        input_name: str,
+        tensors: Iterable[np.ndarray],
+        output_name: str,
+    ) -> Iterator[np.ndarray]:
+        responses: queue.Queue = queue.Queue()
+        # Responses may arrive out of order, they are yielded as sent
+        pending: dict[int, np.ndarray] = {}
+
+        def receive(block: bool) -> bool:
+            try:
+                result, error = responses.get(block=block)
+            except queue.Empty:
+                return False
+            if error is not None:
+                raise error
+            request_id = int(result.get_response().id)
+            pending[request_id] = result.as_numpy(output_name)
+            return True
+
+        self._client.start_stream(
+            callback=lambda result, error: responses.put((result, error))
+        )
+        try:
+            sent = 0
+            yielded = 0
+            for data in tensors:
+                # Bound the requests held in memory before sending more
+                while sent - yielded >= self.max_in_flight:
+                    if yielded in pending:
+                        yield pending.pop(yielded)
+                        yielded += 1
+                    else:
+                        receive(block=True)
+                self._client.async_stream_infer(
+                    model_name,
+                    self._inputs(input_name, data),
+                    request_id=str(sent),
+                )
+                sent += 1
+                # Hand out whatever already came back without waiting
+                while receive(block=False):
+                    pass
+                while yielded in pending:
+                    yield pending.pop(yielded)
+                    yielded += 1
+
+            while yielded < sent:
+                if yielded in pending:
+                    yield pending.pop(yielded)
+                    yielded += 1
+                else:
+                    receive(block=True)
+        finally:
+            self._client.stop_stream()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+TRANSPORTS: dict[str, type[InferenceTransport]] = {
+    "http": HttpTransport,
+    "grpc": GrpcTransport,
+}
+
+
+def create_transport(
+    protocol: str = "http", server_url: str | None = None
+) -> InferenceTransport:
+    """
+    Create the transport for a protocol.
+
+    Args:
+        protocol (str, optional): "http" or "grpc". Defaults to "http".
+        server_url (str, optional): URL of the Triton Inference Server.
+            Defaults to port 8000 for HTTP and 8001 for gRPC on localhost.
+
+    Raises:
+        ValueError: If the protocol is not supported.
+    return:
+        InferenceTransport: Transport connected to the server.
+    """
+    if protocol not in TRANSPORTS:
+        raise ValueError(
+            f"Unsupported protocol '{protocol}', use one of {sorted(TRANSPORTS)}."
+        )
+    return TRANSPORTS[protocol](server_url or DEFAULT_SERVER_URLS[protocol])
+
+
+class TransportPool:
+    """
+    Thread-safe pool of transports to one server.
+
+    tritonclient clients must not be shared between threads, so the pool
+    hands each caller its own transport and keeps it open for reuse.
+
+    Example:
+        with pool.acquire() as transport:
+            predictions = list(
+                stream_inference(images, model_name, classes, models, transport=transport)
+            )
+
+    Args:
+        protocol (str, optional): "http" or "grpc". Defaults to "http".
+        server_url (str, optional): URL of the Triton Inference Server.
+            Defaults to port 8000 for HTTP and 8001 for gRPC on localhost.
+        max_size (int, optional): Maximum number of open transports. Defaults to 4.
+    """
+
+    def __init__(
+        self,
+        protocol: str = "http",
+        server_url: str | None = None,
+        max_size: int = 4,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.protocol = protocol
+        self.server_url = server_url
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    @contextmanager
+    def acquire(self) -> Iterator[InferenceTransport]:
+        """Borrow a transport, blocking while `max_size` are in use."""
+        self._slots.acquire()
+        try:
+            try:
+                transport = self._idle.get_nowait()
+            except queue.Empty:
+                transport = create_transport(self.protocol, self.server_url)
+            try:
+                yield transport
+            except BaseException:
+                # The connection may be in a broken state, do not reuse it
+                transport.close()
+                raise
+            self._idle.put(transport)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Close the idle transports."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -14,6 +14,9 @@ if __name__ == "__main__":
     ]
 
     MODELS = {
+        # A server built with MODEL_CONFIGS=deployment/dev/triton_server/bucketed
+        # only accepts batches, add "batched": True (and "buckets", so Triton
+        # can batch requests together) to talk to it
         "ensemble_model": {"input": "input_image", "output": "probabilities_output"},
         "image_preprocessor": {"input": "input_image", "output": "processed_image"},
         "image_classifier": {"input": "processed_image", "output": "probabilities_output"},
@@ -0,0 +1,168 @@
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pytest
+
+DEFAULT_BASELINE = Path("tests") / "benchmarks" / "baseline.json"
+
+_CALIBRATION_ARRAY = np.random.default_rng(0).random(256 * 1024, "float32")
+_CALIBRATION_BUFFER = np.empty_like(_CALIBRATION_ARRAY)
+
+
+def calibration_workload() -> float:
+    """
+    Fixed mix of vectorized and interpreted work, timed next to every benchmark.
+
+    Benchmarks are stored relative to it, so a faster or busier machine
+    scales both timings instead of tripping the threshold. It writes into a
+    preallocated buffer, so its own time does not depend on page faults.
+    """
+    np.multiply(_CALIBRATION_ARRAY, 0.5, out=_CALIBRATION_BUFFER)
+    np.add(_CALIBRATION_BUFFER, 1.0, out=_CALIBRATION_BUFFER)
+    total = float(_CALIBRATION_BUFFER.sum())
+    for value in range(2000):
+        total += value % 7
+    return total
+
+
+class BenchmarkRecorder:
+    """
+    Times callables and compares them against stored baseline ratios.
+
+    Each round measures the CPU time of the calibration workload right
+    before the callable. The fastest CPU time of the callable is stored as a
+    ratio of the median calibration time: as with `timeit`, the fastest round
+    is the least disturbed by page faults, cache misses and other noise.
+    CPU time ignores other processes competing for the CPU, and dividing by
+    the calibration makes ratios carry over between machines where seconds
+    do not. Wall-clock timings are kept in the results for reference.
+
+    Args:
+        baseline: Mapping of benchmark name to its baseline result.
+        threshold: Allowed relative slowdown over the baseline.
+        save: Record the results without comparing them, to re-baseline.
+        calibrate: Reference workload the timings are divided by.
+    """
+
+    def __init__(
+        self,
+        baseline: dict[str, dict[str, float]],
+        threshold: float,
+        save: bool = False,
+        calibrate: Callable[[], Any] = calibration_workload,
+    ):
+        self.baseline = baseline
+        self.threshold = threshold
+        self.save = save
+        self.calibrate = calibrate
+        self.results: dict[str, dict[str, float]] = {}
+
+    def measure(
+        self, func: Callable[[], Any], rounds: int, warmup: int
+    ) -> dict[str, float]:
+        """Time `func` once per round, next to the calibration workload."""
+        for _ in range(warmup):
+            self.calibrate()
+            func()
+        timings = []
+        cpu_timings = []
+        calibration_timings = []
+        for _ in range(rounds):
+            # CPU time leaves out the time other processes hold the CPU
+            start = time.process_time()
+            self.calibrate()
+            calibration_timings.append(time.process_time() - start)
+            start_wall = time.perf_counter()
+            start = time.process_time()
+            func()
+            cpu_timings.append(time.process_time() - start)
+            timings.append(time.perf_counter() - start_wall)
+
+        return {
+            "ratio": min(cpu_timings) / statistics.median(calibration_timings),
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "rounds": rounds,
+        }
+
+    def __call__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        rounds: int = 20,
+        warmup: int = 2,
+        attempts: int = 3,
+    ) -> dict[str, float]:
+        """
+        Run `func` and fail when its relative time regresses past the threshold.
+
+        A baseline is the median of `attempts` measurements. A regression
+        must show in every one of `attempts` measurements, so a single
+        disturbed measurement does not fail the run.
+
+        Args:
+            name: Unique benchmark name, used as key in the baseline file.
+            func: Callable without arguments to time.
+            rounds: Number of timed calls per measurement.
+            warmup: Number of untimed calls run before each measurement.
+            attempts: Number of measurements.
+        """
+        if self.save:
+            measurements = [
+                self.measure(func, rounds, warmup) for _ in range(attempts)
+            ]
+            result = sorted(measurements, key=lambda m: m["ratio"])[
+                len(measurements) // 2
+            ]
+            self.results[name] = result
+            return result
+
+        if name not in self.baseline:
+            pytest.fail(
+                f"Benchmark '{name}' has no baseline, record one with "
+                "--benchmark-save."
+            )
+        allowed = self.baseline[name]["ratio"] * (1 + self.threshold)
+        for _ in range(attempts):
+            result = self.measure(func, rounds, warmup)
+            self.results[name] = result
+            if result["ratio"] <= allowed:
+                return result
+        pytest.fail(
+            f"Benchmark '{name}' regressed: {result['ratio']:.3f}x the "
+            f"calibration workload exceeds {allowed:.3f}x (baseline "
+            f"{self.baseline[name]['ratio']:.3f}x + {self.threshold:.0%}) "
+            f"in {attempts} attempts"
+        )
+
+
+@pytest.fixture(scope="session")
+def benchmark_recorder(pytestconfig):
+    baseline_path = Path(
+        pytestconfig.getoption("--benchmark-baseline")
+        or pytestconfig.rootpath / DEFAULT_BASELINE
+    )
+    baseline = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+
+    save = pytestconfig.getoption("--benchmark-save")
+    recorder = BenchmarkRecorder(
+        baseline, pytestconfig.getoption("--benchmark-threshold"), save
+    )
+    yield recorder
+
+    if save and recorder.results:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(
+            json.dumps({**baseline, **recorder.results}, indent=2) + "\n"
+        )
+
+
+@pytest.fixture
+def benchmark(benchmark_recorder):
+    return benchmark_recorder
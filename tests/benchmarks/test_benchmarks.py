@@ -0,0 +1,219 @@
+"""
+Offline microbenchmarks of the hot paths, no Triton server required.
+
+Run them and compare against the stored baseline with:
+    pytest tests/benchmarks --run-benchmarks
+Record a new baseline on the current machine with:
+    pytest tests/benchmarks --run-benchmarks --benchmark-save
+"""
+
+import itertools
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+import torch
+import tritonclient.http as httpclient
+from PIL import Image
+from transformers import ViTImageProcessor
+from tritonclient.grpc._utils import _get_inference_request
+
+from imageclassifier import create_model_repository
+from imageclassifier.client import _image_tensor, _preprocess_image
+from imageclassifier.features.image_preprocessor import (
+    execute_feature_extractor,
+    execute_feature_extractor_into,
+)
+from imageclassifier.transport import create_transport
+
+pytestmark = pytest.mark.benchmark
+
+# (height, width) of typical uploads: thumbnail, VGA, full HD
+IMAGE_SIZES = [(224, 224), (480, 640), (1080, 1920)]
+BATCH_SIZES = [1, 8]
+
+ENSEMBLE_CONFIG = {
+    "input": {
+        "name": "input_image",
+        "data_type": "TYPE_FP32",
+        "dims": [3, -1, -1],
+    },
+    "output": {
+        "name": "probabilities_output",
+        "data_type": "TYPE_FP32",
+        "dims": [-1, 7],
+    },
+    "ensemble_steps": [
+        {
+            "model_name": "image_preprocessor",
+            "model_version": -1,
+            "input_map": {"image_preprocessor_input": "input_image"},
+            "output_map": {"image_preprocessor_output": "preprocessed_image"},
+        },
+        {
+            "model_name": "vit_base_patch16_384",
+            "model_version": -1,
+            "input_map": {"features": "preprocessed_image"},
+            "output_map": {"probabilities": "probabilities_output"},
+        },
+    ],
+}
+
+
+def _size_id(size: tuple[int, int]) -> str:
+    return f"{size[0]}x{size[1]}"
+
+
+@pytest.fixture(scope="module")
+def feature_extractor():
+    return ViTImageProcessor(size={"height": 384, "width": 384})
+
+
+@pytest.mark.parametrize("size", IMAGE_SIZES, ids=_size_id)
+def test_bench_execute_feature_extractor(benchmark, feature_extractor, size):
+    image = np.random.rand(3, *size).astype("float32")
+
+    benchmark(
+        f"execute_feature_extractor[{_size_id(size)}]",
+        lambda: execute_feature_extractor(feature_extractor, image),
+    )
+
+
+@pytest.mark.parametrize("size", IMAGE_SIZES, ids=_size_id)
+def test_bench_execute_feature_extractor_into(
+    benchmark, feature_extractor, size
+):
+    image = torch.rand(3, *size)
+    out = torch.empty((1, 3, 384, 384))
+
+    benchmark(
+        f"execute_feature_extractor_into[{_size_id(size)}]",
+        lambda: execute_feature_extractor_into(feature_extractor, image, out),
+    )
+
+
+@pytest.mark.parametrize("size", IMAGE_SIZES, ids=_size_id)
+def test_bench_preprocess_image(benchmark, size):
+    image = Image.new("RGB", (size[1], size[0]))
+
+    benchmark(
+        f"preprocess_image[{_size_id(size)}]",
+        lambda: _preprocess_image(image),
+    )
+
+
+# bound before the client class is patched
+_generate_request_body = httpclient.InferenceServerClient.generate_request_body
+
+
+class _SerializingHttpClient:
+    """InferenceServerClient stand-in that builds the request body offline."""
+
+    def __init__(self, url, *args, **kwargs):
+        pass
+
+    def infer(self, model_name, inputs, *args, **kwargs):
+        _generate_request_body(inputs)
+        return _RESPONSE
+
+    def close(self):
+        pass
+
+
+class _SerializingGrpcClient:
+    """InferenceServerClient stand-in that builds the request protobuf offline."""
+
+    def __init__(self, url, *args, **kwargs):
+        pass
+
+    def infer(self, model_name, inputs, *args, **kwargs):
+        _get_inference_request(
+            model_name=model_name,
+            inputs=inputs,
+            model_version="",
+            request_id="",
+            outputs=None,
+            sequence_id=0,
+            sequence_start=False,
+            sequence_end=False,
+            priority=0,
+            timeout=None,
+            parameters=None,
+        ).SerializeToString()
+        return _RESPONSE
+
+    def close(self):
+        pass
+
+
+_RESPONSE = Mock()
+_RESPONSE.as_numpy.return_value = np.zeros((1, 7), dtype="float32")
+
+STUB_CLIENTS = {
+    "http": ("imageclassifier.transport.httpclient", _SerializingHttpClient),
+    "grpc": ("imageclassifier.transport.grpcclient", _SerializingGrpcClient),
+}
+
+
+# A single full HD image takes either ~45 ms or ~90 ms per call depending on
+# the memory state of the process, too unstable to compare between runs;
+# batches of full HD images are stable and cover the same path.
+SERIALIZATION_CASES = [
+    (size, batch_size)
+    for size, batch_size in itertools.product(IMAGE_SIZES, BATCH_SIZES)
+    if (size, batch_size) != ((1080, 1920), 1)
+]
+
+
+@pytest.mark.parametrize("protocol", sorted(STUB_CLIENTS))
+@pytest.mark.parametrize(
+    "size,batch_size",
+    SERIALIZATION_CASES,
+    ids=[f"{_size_id(size)}-{batch}" for size, batch in SERIALIZATION_CASES],
+)
+def test_bench_request_serialization(benchmark, size, batch_size, protocol):
+    module, stub_client = STUB_CLIENTS[protocol]
+    image = Image.new("RGB", (size[1], size[0]))
+    config = {"input": "input_image", "output": "probabilities_output"}
+
+    def build_request():
+        if batch_size == 1:
+            tensor = _image_tensor(image, config)
+        else:
+            # stacked the way MicroBatcher sends concurrent images
+            tensor = np.stack(
+                [_preprocess_image(image, config) for _ in range(batch_size)]
+            )
+        transport.infer(
+            "ensemble_model", config["input"], tensor, config["output"]
+        )
+
+    with patch(f"{module}.InferenceServerClient", stub_client):
+        with create_transport(protocol) as transport:
+            benchmark(
+                f"request_serialization[{protocol}-{_size_id(size)}-"
+                f"{batch_size}]",
+                build_request,
+            )
+
+
+def test_bench_create_model_repository(benchmark, tmp_path: Path):
+    counter = itertools.count()
+
+    def create_repositories():
+        # one call takes ~0.1 ms, time several so file system jitter averages out
+        for _ in range(10):
+            create_model_repository(
+                "ensemble_model",
+                1,
+                "python",
+                ENSEMBLE_CONFIG,
+                base_path=str(tmp_path / str(next(counter))),
+            )
+
+    benchmark(
+        "create_model_repository[ensemble-x10]",
+        create_repositories,
+        rounds=100,
+    )
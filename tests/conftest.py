@@ -0,0 +1,44 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark", "offline microbenchmarks")
+    group.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="Run the microbenchmarks in tests/benchmarks.",
+    )
+    group.addoption(
+        "--benchmark-baseline",
+        default=None,
+        help="JSON file with the baseline results to compare against, "
+        "defaults to tests/benchmarks/baseline.json in the rootdir.",
+    )
+    group.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown over the baseline, e.g. 0.5 for 50%%.",
+    )
+    group.addoption(
+        "--benchmark-save",
+        action="store_true",
+        default=False,
+        help="Write the measured timings to the baseline file.",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: offline microbenchmark, needs --run-benchmarks"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="needs --run-benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
@@ -0,0 +1,211 @@
+import importlib.util
+import sys
+import types
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import torch
+from transformers import ViTImageProcessor
+
+MODEL_PATH = (
+    Path(__file__).parents[2]
+    / "deployment"
+    / "dev"
+    / "triton_server"
+    / "preprocessor"
+    / "model.py"
+)
+
+
+class StubTensor:
+    """Minimal pb_utils.Tensor recording how data crosses the backend."""
+
+    copies = 0
+    dlpack_exports = 0
+    dlpack_imports = 0
+
+    def __init__(self, name: str, array: np.ndarray):
+        # pb_utils.Tensor(name, numpy_array) copies the array
+        StubTensor.copies += 1
+        self._name = name
+        self._tensor = torch.from_numpy(np.array(array))
+
+    @classmethod
+    def from_dlpack(cls, name: str, capsule) -> "StubTensor":
+        cls.dlpack_imports += 1
+        tensor = cls.__new__(cls)
+        tensor._name = name
+        tensor._tensor = torch.utils.dlpack.from_dlpack(capsule)
+        return tensor
+
+    def name(self) -> str:
+        return self._name
+
+    def as_numpy(self) -> np.ndarray:
+        StubTensor.copies += 1
+        return self._tensor.numpy().copy()
+
+    def to_dlpack(self):
+        StubTensor.dlpack_exports += 1
+        return torch.utils.dlpack.to_dlpack(self._tensor)
+
+
+class StubInferenceResponse:
+    def __init__(self, output_tensors):
+        self.output_tensors = output_tensors
+
+
+def _get_input_tensor_by_name(request, name):
+    return request[name]
+
+
+@pytest.fixture
+def pb_utils():
+    module = types.ModuleType("triton_python_backend_utils")
+    module.Tensor = StubTensor
+    module.InferenceResponse = StubInferenceResponse
+    module.get_input_tensor_by_name = _get_input_tensor_by_name
+    StubTensor.copies = 0
+    StubTensor.dlpack_exports = 0
+    StubTensor.dlpack_imports = 0
+    with patch.dict(sys.modules, {"triton_python_backend_utils": module}):
+        yield module
+
+
+@pytest.fixture
+def preprocessor_module(pb_utils):
+    spec = importlib.util.spec_from_file_location(
+        "preprocessor_model", MODEL_PATH
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def preprocessor_model(preprocessor_module):
+    module = preprocessor_module
+    feature_extractor = ViTImageProcessor(size={"height": 384, "width": 384})
+    with patch.object(
+        module.ViTImageProcessor,
+        "from_pretrained",
+        return_value=feature_extractor,
+    ):
+        model = module.TritonPythonModel()
+        model.initialize({})
+    return model
+
+
+def _request(image: np.ndarray) -> dict[str, StubTensor]:
+    tensor = StubTensor.from_dlpack(
+        "image_preprocessor_input",
+        torch.utils.dlpack.to_dlpack(torch.from_numpy(image)),
+    )
+    StubTensor.dlpack_imports = 0
+    return {"image_preprocessor_input": tensor}
+
+
+def test_execute_matches_feature_extractor(preprocessor_model):
+    # GIVEN
+    image = np.random.rand(3, 200, 300).astype("float32")
+
+    # WITH
+    responses = preprocessor_model.execute([_request(image)])
+
+    # THEN
+    expected = preprocessor_model.feature_extractor(
+        images=image, return_tensors="pt"
+    ).pixel_values
+    (output,) = responses[0].output_tensors
+    assert output.name() == "image_preprocessor_output"
+    torch.testing.assert_close(output._tensor, expected, atol=1e-5, rtol=0)
+
+
+def test_execute_hands_off_tensors_without_copies(
+    preprocessor_module, preprocessor_model
+):
+    # GIVEN
+    images = [
+        np.random.rand(3, 200, 300).astype("float32"),
+        np.random.rand(3, 480, 640).astype("float32"),
+        np.random.rand(3, 64, 64).astype("float32"),
+    ]
+    requests = [_request(image) for image in images]
+    module = preprocessor_module
+    real_execute = module.execute_feature_extractor_into
+    seen_inputs = []
+
+    def spy(feature_extractor, image, out):
+        seen_inputs.append(image)
+        return real_execute(feature_extractor, image, out)
+
+    empty_calls = []
+    real_empty = torch.empty
+
+    def counting_empty(*args, **kwargs):
+        empty_calls.append(args)
+        return real_empty(*args, **kwargs)
+
+    interpolate_calls = []
+    real_interpolate = torch.nn.functional.interpolate
+
+    def counting_interpolate(*args, **kwargs):
+        interpolate_calls.append(args)
+        return real_interpolate(*args, **kwargs)
+
+    # WITH
+    with (
+        patch.object(
+            module, "execute_feature_extractor_into", side_effect=spy
+        ),
+        patch.object(module.torch, "empty", side_effect=counting_empty),
+        patch.object(
+            torch.nn.functional,
+            "interpolate",
+            side_effect=counting_interpolate,
+        ),
+    ):
+        responses = preprocessor_model.execute(requests)
+
+    # THEN
+    # no numpy round trips: inputs are read and outputs created via DLPack
+    assert StubTensor.copies == 0
+    assert StubTensor.dlpack_exports == len(requests)
+    assert StubTensor.dlpack_imports == len(requests)
+
+    # inputs are zero-copy views of the request tensors
+    for image, seen in zip(images, seen_inputs):
+        assert seen.data_ptr() == image.ctypes.data
+
+    # a single output buffer is allocated for the whole call, plus the
+    # resized intermediate of each request
+    assert len(empty_calls) == 1
+    assert len(interpolate_calls) == len(requests)
+    outputs = [response.output_tensors[0]._tensor for response in responses]
+    buffer_start = outputs[0].data_ptr()
+    for idx, output in enumerate(outputs):
+        assert output.shape == (1, 3, 384, 384)
+        assert (
+            output.data_ptr()
+            == buffer_start + idx * output.numel() * output.element_size()
+        )
+
+
+def test_execute_batched_requests(preprocessor_model):
+    # GIVEN
+    batch = np.random.rand(4, 3, 288, 512).astype("float32")
+    single = np.random.rand(2, 3, 384, 384).astype("float32")
+
+    # WITH
+    responses = preprocessor_model.execute([_request(batch), _request(single)])
+
+    # THEN
+    outputs = [response.output_tensors[0]._tensor for response in responses]
+    assert outputs[0].shape == (4, 3, 384, 384)
+    assert outputs[1].shape == (2, 3, 384, 384)
+    expected = preprocessor_model.feature_extractor(
+        images=list(batch), return_tensors="pt"
+    ).pixel_values
+    torch.testing.assert_close(outputs[0], expected, atol=1e-5, rtol=0)
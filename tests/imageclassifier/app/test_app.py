@@ -0,0 +1,209 @@
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+import streamlit as st
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+from imageclassifier.transport import InferenceTransport
+
+APP_PATH = str(
+    Path(__file__).parents[3] / "imageclassifier" / "app" / "app.py"
+)
+UPLOAD_FOLDER = "uploaded_images"
+CLASSIFY_ALL = 1
+
+
+def _resolved(prediction) -> Future:
+    future: Future = Future()
+    future.set_result(prediction)
+    return future
+
+
+@pytest.fixture
+def upload_folder(tmp_path: Path, monkeypatch) -> Path:
+    """Run the app in an empty directory with fresh Streamlit caches."""
+    monkeypatch.chdir(tmp_path)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield tmp_path / UPLOAD_FOLDER
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def mock_transport():
+    """Transport of the app's pool, to a server serving the model batched."""
+    transport = Mock(spec=InferenceTransport)
+    transport.model_max_batch_size.return_value = 8
+    transport.stream_infer.side_effect = lambda model, inp, tensors, out: (
+        np.eye(1, 7, 2, dtype=np.float32) for _ in tensors
+    )
+    with patch(
+        "imageclassifier.transport.create_transport", return_value=transport
+    ):
+        yield transport
+
+
+@pytest.fixture
+def mock_batcher_class(mock_transport):
+    with patch("imageclassifier.MicroBatcher", autospec=True) as batcher_class:
+        batcher = batcher_class.return_value
+        batcher.closed = False
+        batcher.submit.side_effect = lambda image: _resolved((2, "bunny"))
+        yield batcher_class
+
+
+def _run_app() -> AppTest:
+    app = AppTest.from_file(APP_PATH, default_timeout=30)
+    app.run()
+    return app
+
+
+def _add_images(folder: Path, *names: str, mode: str = "RGB") -> None:
+    folder.mkdir(exist_ok=True)
+    for idx, name in enumerate(names):
+        Image.new(mode, (64, 48), idx * 40).save(folder / name)
+
+
+def test_classify_all_sends_only_new_images(
+    upload_folder: Path, mock_batcher_class
+):
+    # GIVEN
+    _add_images(upload_folder, "a.png", "b.png")
+    app = _run_app()
+    batcher = mock_batcher_class.return_value
+
+    # WITH
+    app.button[CLASSIFY_ALL].click().run()
+
+    # THEN
+    assert not app.exception
+    assert not app.error
+    assert batcher.submit.call_count == 2
+
+    # WITH
+    app.button[CLASSIFY_ALL].click().run()
+
+    # THEN
+    assert batcher.submit.call_count == 2
+
+    # WITH
+    _add_images(upload_folder, "a.png", "b.png", "c.jpg")
+    app.button[CLASSIFY_ALL].click().run()
+
+    # THEN
+    assert not app.exception
+    assert batcher.submit.call_count == 3
+    mock_batcher_class.assert_called_once()
+
+
+def test_classify_image_reuses_folder_predictions(
+    upload_folder: Path, mock_batcher_class
+):
+    # GIVEN
+    _add_images(upload_folder, "a.png")
+    app = _run_app()
+    app.button[CLASSIFY_ALL].click().run()
+
+    # WITH
+    app.selectbox[0].select("a.png").run()
+    app.button[0].click().run()
+
+    # THEN
+    assert not app.exception
+    assert "bunny" in app.markdown[0].value
+    mock_batcher_class.return_value.submit.assert_called_once()
+
+
+def test_preview_of_cmyk_image(upload_folder: Path, mock_batcher_class):
+    # GIVEN
+    _add_images(upload_folder, "cmyk.jpg", mode="CMYK")
+    app = _run_app()
+
+    # WITH
+    app.selectbox[0].select("cmyk.jpg").run()
+    app.button[0].click().run()
+
+    # THEN
+    assert not app.exception
+    assert not app.warning
+    assert not app.error
+    image = mock_batcher_class.return_value.submit.call_args.args[0]
+    assert image.mode == "RGB"
+
+
+def test_unreadable_image_does_not_break_the_page(
+    upload_folder: Path, mock_batcher_class
+):
+    # GIVEN
+    upload_folder.mkdir()
+    (upload_folder / "broken.jpg").write_bytes(b"not an image")
+    app = _run_app()
+
+    # WITH
+    app.selectbox[0].select("broken.jpg").run()
+
+    # THEN
+    assert not app.exception
+    assert "Cannot display broken.jpg" in app.warning[0].value
+
+
+def test_classify_reports_unreachable_server(upload_folder: Path):
+    # GIVEN
+    _add_images(upload_folder, "a.png")
+    app = _run_app()
+
+    # WITH
+    with patch(
+        "imageclassifier.transport.create_transport",
+        side_effect=ConnectionRefusedError("server down"),
+    ):
+        app.button[CLASSIFY_ALL].click().run()
+
+    # THEN
+    assert not app.exception
+    assert "server down" in app.error[0].value
+
+
+def test_closed_batcher_is_replaced(upload_folder: Path, mock_batcher_class):
+    # GIVEN
+    _add_images(upload_folder, "a.png", "b.png")
+    app = _run_app()
+    app.selectbox[0].select("a.png").run()
+    app.button[0].click().run()
+
+    # WITH
+    mock_batcher_class.return_value.closed = True
+    app.selectbox[0].select("b.png").run()
+    app.button[0].click().run()
+
+    # THEN
+    assert not app.exception
+    assert mock_batcher_class.call_count == 2
+
+
+def test_unbatched_server_streams_images_over_pooled_transport(
+    upload_folder: Path, mock_batcher_class, mock_transport
+):
+    # GIVEN
+    mock_transport.model_max_batch_size.return_value = 0
+    _add_images(upload_folder, "a.png", "b.png")
+    app = _run_app()
+
+    # WITH
+    app.button[CLASSIFY_ALL].click().run()
+    app.selectbox[0].select("a.png").run()
+    app.button[0].click().run()
+
+    # THEN
+    assert not app.exception
+    assert not app.error
+    assert "bunny" in app.markdown[0].value
+    mock_transport.stream_infer.assert_called_once()
+    # returned to the pool for the next run instead of closed
+    mock_transport.close.assert_not_called()
+    mock_batcher_class.assert_not_called()
@@ -0,0 +1,252 @@
+import io
+import os
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from imageclassifier import MicroBatcher
+from imageclassifier.app.utils import (
+    PredictionCache,
+    batch_predictions,
+    classify_images,
+    downscale_image,
+    file_digest,
+    list_images,
+    save_upload,
+)
+
+CLASSES = [
+    "house",
+    "tree",
+    "bunny",
+    "turtle",
+    "storm",
+    "record-player",
+    "ron-howard",
+]
+
+
+def _save_image(path: Path, color, size=(32, 24), mode="RGB") -> str:
+    Image.new(mode, size, color).save(path)
+    return str(path)
+
+
+def _resolved(prediction) -> Future:
+    future: Future = Future()
+    future.set_result(prediction)
+    return future
+
+
+def _batched(batcher):
+    return lambda images: batch_predictions(batcher, images)
+
+
+@pytest.fixture
+def mock_batcher():
+    batcher = Mock(spec=MicroBatcher)
+    batcher.submit.side_effect = lambda image: _resolved((2, "bunny"))
+    return batcher
+
+
+def test_prediction_cache_evicts_least_recently_used():
+    # GIVEN
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", (0, "house"))
+    cache.put("b", (1, "tree"))
+
+    # WITH
+    assert cache.get("a") == (0, "house")
+    cache.put("c", (2, "bunny"))
+
+    # THEN
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == (0, "house")
+    assert cache.get("c") == (2, "bunny")
+
+
+def test_prediction_cache_rejects_invalid_size():
+    with pytest.raises(ValueError, match="max_entries"):
+        PredictionCache(max_entries=0)
+
+
+def test_list_images_keeps_image_files_only(tmp_path: Path):
+    # GIVEN
+    _save_image(tmp_path / "b.PNG", "red")
+    _save_image(tmp_path / "a.jpg", "red")
+    (tmp_path / "notes.txt").write_text("not an image")
+    (tmp_path / "folder.png").mkdir()
+
+    # THEN
+    assert list_images(str(tmp_path)) == ["a.jpg", "b.PNG"]
+
+
+def test_save_upload_writes_only_changed_content(tmp_path: Path):
+    # GIVEN
+    path = save_upload(str(tmp_path), "../upload.png", b"first")
+    os.utime(path, ns=(0, 0))
+
+    # WITH
+    same_path = save_upload(str(tmp_path), "upload.png", b"first")
+
+    # THEN
+    assert same_path == path == str(tmp_path / "upload.png")
+    assert os.stat(path).st_mtime_ns == 0
+
+    # WITH
+    save_upload(str(tmp_path), "upload.png", b"second")
+
+    # THEN
+    assert Path(path).read_bytes() == b"second"
+
+
+@pytest.mark.parametrize("mode", ["RGB", "CMYK", "L", "P"])
+def test_downscale_image_encodes_png_preview(tmp_path: Path, mode):
+    # GIVEN
+    extension = "jpg" if mode in ("RGB", "CMYK", "L") else "png"
+    path = _save_image(
+        tmp_path / f"image.{extension}", 128, size=(640, 480), mode=mode
+    )
+
+    # WITH
+    preview = downscale_image(path, (160, 160))
+
+    # THEN
+    with Image.open(io.BytesIO(preview)) as image:
+        assert image.format == "PNG"
+        assert image.size == (160, 120)
+
+
+def test_classify_images_sends_only_uncached_images(
+    tmp_path: Path, mock_batcher
+):
+    # GIVEN
+    paths = [
+        _save_image(tmp_path / "cached.png", "red"),
+        _save_image(tmp_path / "new.png", "green"),
+        _save_image(tmp_path / "copy_of_new.png", "green"),
+    ]
+    digests = [file_digest(path) for path in paths]
+    cache = PredictionCache()
+    cache.put(digests[0], (0, "house"))
+
+    # WITH
+    predictions = classify_images(
+        paths, digests, cache, _batched(mock_batcher)
+    )
+
+    # THEN
+    assert predictions == [(0, "house"), (2, "bunny"), (2, "bunny")]
+    mock_batcher.submit.assert_called_once()
+    assert cache.get(digests[1]) == (2, "bunny")
+
+    # WITH
+    classify_images(paths, digests, cache, _batched(mock_batcher))
+
+    # THEN
+    mock_batcher.submit.assert_called_once()
+
+
+def test_classify_images_converts_images_to_rgb(tmp_path: Path, mock_batcher):
+    # GIVEN
+    path = _save_image(tmp_path / "cmyk.jpg", 128, mode="CMYK")
+
+    # WITH
+    classify_images(
+        [path], [file_digest(path)], PredictionCache(), _batched(mock_batcher)
+    )
+
+    # THEN
+    assert mock_batcher.submit.call_args.args[0].mode == "RGB"
+
+
+def test_classify_images_does_not_cache_failures(tmp_path: Path, mock_batcher):
+    # GIVEN
+    path = _save_image(tmp_path / "image.png", "red")
+    digest = file_digest(path)
+    failed: Future = Future()
+    failed.set_exception(ConnectionError("server down"))
+    mock_batcher.submit.side_effect = [failed]
+    cache = PredictionCache()
+
+    # WITH
+    with pytest.raises(ConnectionError, match="server down"):
+        classify_images([path], [digest], cache, _batched(mock_batcher))
+
+    # THEN
+    assert cache.get(digest) is None
+
+
+def test_classify_images_streams_uncached_images_in_order(tmp_path: Path):
+    # GIVEN
+    paths = [
+        _save_image(tmp_path / f"{idx}.png", (idx * 40, 0, 0))
+        for idx in range(3)
+    ]
+    digests = [file_digest(path) for path in paths]
+    cache = PredictionCache()
+    cache.put(digests[1], (1, "tree"))
+    sent = []
+
+    def predict(images):
+        for image in images:
+            sent.append(image.getpixel((0, 0)))
+            yield 2, "bunny"
+
+    # WITH
+    predictions = classify_images(paths, digests, cache, predict)
+
+    # THEN
+    assert predictions == [(2, "bunny"), (1, "tree"), (2, "bunny")]
+    assert sent == [(0, 0, 0), (80, 0, 0)]
+
+
+def test_classify_images_sends_uncached_images_in_one_batch(tmp_path: Path):
+    # GIVEN
+    paths = [
+        _save_image(tmp_path / f"{idx}.png", (idx * 40, 0, 0))
+        for idx in range(3)
+    ]
+    models = {
+        "ensemble_model": {
+            "input": "input_image",
+            "output": "probabilities_output",
+            "buckets": [(16, 16)],
+        },
+    }
+    with patch(
+        "imageclassifier.transport.httpclient.InferenceServerClient",
+        autospec=True,
+    ) as mock_client:
+        client_instance = mock_client.return_value
+        client_instance.get_model_config.return_value = {"max_batch_size": 8}
+        probabilities = np.zeros((3, 7), dtype=np.float32)
+        probabilities[:, 2] = 1.0
+        client_instance.infer.return_value.as_numpy.return_value = (
+            probabilities
+        )
+
+        # WITH
+        with MicroBatcher(
+            "ensemble_model",
+            CLASSES,
+            models,
+            max_batch_size=3,
+            max_wait_us=5_000_000,
+        ) as batcher:
+            predictions = classify_images(
+                paths,
+                [file_digest(path) for path in paths],
+                PredictionCache(),
+                _batched(batcher),
+            )
+
+    # THEN
+    assert predictions == [(2, "bunny")] * 3
+    client_instance.infer.assert_called_once()
+    inputs = client_instance.infer.call_args.args[1]
+    assert list(inputs[0].shape()) == [3, 3, 16, 16]
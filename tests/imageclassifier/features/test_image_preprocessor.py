@@ -2,8 +2,13 @@ from unittest.mock import Mock
 
 import numpy as np
 import pytest
+import torch
+from transformers import ViTImageProcessor
 
-from imageclassifier.features.image_preprocessor import execute_feature_extractor
+from imageclassifier.features.image_preprocessor import (
+    execute_feature_extractor,
+    execute_feature_extractor_into,
+)
 
 
 @pytest.fixture
@@ -39,3 +44,20 @@ def test_execute_feature_extractor(mock_feature_extractor):
     mock_feature_extractor.assert_called_once_with(
         images=test_image, return_tensors="pt"
     )
+
+
+def test_execute_feature_extractor_into_matches_processor():
+    """Test the torch preprocessing against the ViT image processor."""
+    feature_extractor = ViTImageProcessor(size={"height": 384, "width": 384})
+    test_image = np.random.rand(3, 256, 320).astype("float32")
+    out = torch.empty((1, 3, 384, 384))
+
+    result = execute_feature_extractor_into(
+        feature_extractor, torch.from_numpy(test_image), out
+    )
+
+    expected = feature_extractor(
+        images=test_image, return_tensors="pt"
+    ).pixel_values
+    assert result is out, "Result should be written into the output buffer."
+    torch.testing.assert_close(result, expected, atol=1e-5, rtol=0)
@@ -1,13 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch
 
 import numpy as np
 import pytest
+import torch
+from PIL import Image, ImageDraw
+from transformers import ViTImageProcessor
+
+from imageclassifier import MicroBatcher, run_inference
+from imageclassifier.client import (
+    _preprocess_image,
+    bucket_image,
+    select_bucket,
+)
+from imageclassifier.features.image_preprocessor import (
+    execute_feature_extractor_into,
+)
 
 
 @pytest.fixture
 def mock_inference_server_client():
     with patch(
-        "imageclassifier.client.httpclient.InferenceServerClient",
+        "imageclassifier.transport.httpclient.InferenceServerClient",
         autospec=True,
     ) as mock_client:
         client_instance = mock_client.return_value
@@ -56,3 +70,501 @@ def setup_inputs():
         "models": models,
         "server_url": "localhost:8000",
     }
+
+
+@pytest.fixture
+def mock_batched_client():
+    """Mock client whose response has one probability row per batched image."""
+    with patch(
+        "imageclassifier.transport.httpclient.InferenceServerClient",
+        autospec=True,
+    ) as mock_client:
+        client_instance = mock_client.return_value
+        client_instance.get_model_config.return_value = {"max_batch_size": 8}
+
+        def infer(model_name, inputs):
+            batch_size = inputs[0].shape()[0]
+            probabilities = np.zeros((batch_size, 7), dtype=np.float32)
+            probabilities[:, 2] = 1.0
+            response = Mock()
+            response.as_numpy.return_value = probabilities
+            return response
+
+        client_instance.infer.side_effect = infer
+        yield client_instance
+
+
+def test_micro_batcher_coalesces_concurrent_calls(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    images = [Image.new("RGB", (32, 24)) for _ in range(3)]
+
+    # WITH
+    with MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=3,
+        max_wait_us=5_000_000,
+    ) as batcher:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(batcher.run_inference, images))
+
+    # THEN
+    assert results == [(2, "bunny")] * 3
+    mock_batched_client.infer.assert_called_once()
+    model_name, inputs = mock_batched_client.infer.call_args.args
+    assert model_name == "ensemble_model"
+    assert inputs[0].name() == "input_image"
+    assert inputs[0].shape() == [3, 3, 24, 32]
+
+
+def test_micro_batcher_flushes_after_max_wait(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    image = Image.new("RGB", (16, 16))
+
+    # WITH
+    with MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=8,
+        max_wait_us=1000,
+    ) as batcher:
+        result = batcher.submit(image).result(timeout=5)
+
+    # THEN
+    assert result == (2, "bunny")
+    inputs = mock_batched_client.infer.call_args.args[1]
+    assert inputs[0].shape() == [1, 3, 16, 16]
+
+
+def test_micro_batcher_splits_mixed_shapes(mock_batched_client, setup_inputs):
+    # GIVEN
+    images = [
+        Image.new("RGB", (16, 16)),
+        Image.new("RGB", (32, 16)),
+        Image.new("RGB", (16, 16)),
+    ]
+
+    # WITH
+    with MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=3,
+        max_wait_us=5_000_000,
+    ) as batcher:
+        futures = [batcher.submit(image) for image in images]
+        results = [future.result(timeout=5) for future in futures]
+
+    # THEN
+    assert results == [(2, "bunny")] * 3
+    shapes = sorted(
+        call.args[1][0].shape()
+        for call in mock_batched_client.infer.call_args_list
+    )
+    assert shapes == [[1, 3, 16, 32], [2, 3, 16, 16]]
+
+
+def test_micro_batcher_propagates_errors(mock_batched_client, setup_inputs):
+    # GIVEN
+    mock_batched_client.infer.side_effect = RuntimeError("server down")
+
+    # WITH
+    with MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=2,
+        max_wait_us=5_000_000,
+    ) as batcher:
+        futures = [batcher.submit(Image.new("RGB", (8, 8))) for _ in range(2)]
+
+    # THEN
+    for future in futures:
+        with pytest.raises(RuntimeError, match="server down"):
+            future.result(timeout=5)
+
+
+def test_micro_batcher_fails_batch_on_output_count_mismatch(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    response = Mock()
+    response.as_numpy.return_value = np.zeros((1, 7), dtype=np.float32)
+    mock_batched_client.infer.side_effect = None
+    mock_batched_client.infer.return_value = response
+
+    # WITH
+    with MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=2,
+        max_wait_us=5_000_000,
+    ) as batcher:
+        futures = [batcher.submit(Image.new("RGB", (8, 8))) for _ in range(2)]
+
+    # THEN
+    for future in futures:
+        with pytest.raises(ValueError, match="1 outputs for a batch of 2"):
+            future.result(timeout=5)
+
+
+def test_micro_batcher_rejects_unknown_model(setup_inputs):
+    with pytest.raises(ValueError, match="not found"):
+        MicroBatcher(
+            "unknown_model", setup_inputs["classes"], setup_inputs["models"]
+        )
+
+
+def test_micro_batcher_rejects_model_without_batching(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    mock_batched_client.get_model_config.return_value = {"max_batch_size": 0}
+
+    # THEN
+    with pytest.raises(ValueError, match="does not support batching"):
+        MicroBatcher(
+            setup_inputs["model_name"],
+            setup_inputs["classes"],
+            setup_inputs["models"],
+        )
+    mock_batched_client.close.assert_called_once()
+
+
+def test_micro_batcher_caps_batch_size_to_model(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    mock_batched_client.get_model_config.return_value = {"max_batch_size": 2}
+
+    # WITH
+    with MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=8,
+        max_wait_us=5_000_000,
+    ) as batcher:
+        futures = [batcher.submit(Image.new("RGB", (8, 8))) for _ in range(4)]
+        results = [future.result(timeout=5) for future in futures]
+
+    # THEN
+    assert batcher.max_batch_size == 2
+    assert results == [(2, "bunny")] * 4
+    shapes = [
+        list(call.args[1][0].shape())
+        for call in mock_batched_client.infer.call_args_list
+    ]
+    assert shapes == [[2, 3, 8, 8], [2, 3, 8, 8]]
+
+
+def test_micro_batcher_raises_connection_errors(setup_inputs):
+    with patch(
+        "imageclassifier.transport.httpclient.InferenceServerClient",
+        side_effect=ConnectionRefusedError("server down"),
+    ):
+        with pytest.raises(ConnectionRefusedError, match="server down"):
+            MicroBatcher(
+                setup_inputs["model_name"],
+                setup_inputs["classes"],
+                setup_inputs["models"],
+            )
+
+
+def test_micro_batcher_fails_pending_work_when_worker_dies(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    batcher = MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+        max_batch_size=1,
+    )
+
+    # WITH
+    with patch.object(
+        MicroBatcher, "_flush", side_effect=RuntimeError("worker crashed")
+    ):
+        future = batcher.submit(Image.new("RGB", (8, 8)))
+        with pytest.raises(RuntimeError, match="worker crashed"):
+            future.result(timeout=5)
+        batcher._worker.join(timeout=5)
+
+    # THEN
+    assert not batcher._worker.is_alive()
+    with pytest.raises(RuntimeError, match="worker failed"):
+        batcher.submit(Image.new("RGB", (8, 8)))
+    batcher.close()
+    mock_batched_client.close.assert_called_once()
+
+
+def test_micro_batcher_rejects_submit_after_close(
+    mock_batched_client, setup_inputs
+):
+    # GIVEN
+    batcher = MicroBatcher(
+        setup_inputs["model_name"],
+        setup_inputs["classes"],
+        setup_inputs["models"],
+    )
+
+    # WITH
+    batcher.close()
+
+    # THEN
+    assert batcher.closed
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit(Image.new("RGB", (8, 8)))
+
+
+BUCKETS = [(384, 384), (288, 512), (512, 288)]
+
+
+@pytest.mark.parametrize(
+    "height, width, expected",
+    [
+        (400, 400, (384, 384)),
+        (720, 1280, (288, 512)),
+        (1000, 600, (512, 288)),
+    ],
+)
+def test_select_bucket(height, width, expected):
+    assert select_bucket(height, width, BUCKETS) == expected
+
+
+def test_select_bucket_requires_buckets():
+    with pytest.raises(ValueError, match="bucket"):
+        select_bucket(10, 10, [])
+
+
+def test_bucket_image_letterbox_keeps_aspect_ratio():
+    # GIVEN
+    image = Image.new("RGB", (200, 100), color=(255, 255, 255))
+
+    # WITH
+    bucketed = bucket_image(image, [(300, 300)], mode="letterbox")
+
+    # THEN
+    pixels = np.asarray(bucketed)
+    assert bucketed.size == (300, 300)
+    assert pixels[0, 150].tolist() == [0, 0, 0]
+    assert pixels[150, 150].tolist() == [255, 255, 255]
+
+
+def test_bucket_image_rejects_unknown_mode():
+    with pytest.raises(ValueError, match="Unsupported bucket mode"):
+        bucket_image(Image.new("RGB", (8, 8)), BUCKETS, mode="crop")
+
+
+@pytest.mark.parametrize(
+    "model_config, expected_shape",
+    [
+        ({"buckets": BUCKETS, "batched": True}, [1, 3, 288, 512]),
+        ({"buckets": BUCKETS}, [3, 288, 512]),
+        ({"batched": True}, [1, 3, 720, 1280]),
+        ({}, [3, 720, 1280]),
+    ],
+)
+def test_run_inference_batch_dimension_follows_batched_flag(
+    mock_batched_client, setup_inputs, model_config, expected_shape
+):
+    # GIVEN
+    models = {
+        "ensemble_model": {
+            **setup_inputs["models"]["ensemble_model"],
+            **model_config,
+        }
+    }
+
+    # WITH
+    result = run_inference(
+        image=Image.new("RGB", (1280, 720)),
+        model_name="ensemble_model",
+        classes=setup_inputs["classes"],
+        models=models,
+    )
+
+    # THEN
+    assert result == (2, "bunny")
+    inputs = mock_batched_client.infer.call_args.args[1]
+    assert list(inputs[0].shape()) == expected_shape
+
+
+def _high_detail_image(width, height, rng, noise_only=False):
+    """Random noise, or coarse texture with per-pixel noise on top."""
+    if noise_only:
+        pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        return Image.fromarray(pixels)
+    coarse = rng.random((height // 8 + 1, width // 8 + 1, 3)) * 255
+    texture = np.asarray(
+        Image.fromarray(coarse.astype(np.uint8)).resize(
+            (width, height), Image.Resampling.BICUBIC
+        ),
+        dtype=np.float64,
+    )
+    noisy = texture + rng.normal(0, 20, texture.shape)
+    return Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+
+
+@pytest.mark.parametrize(
+    "noise_only, mean_tolerance", [(False, 0.03), (True, 0.06)]
+)
+def test_bucketed_features_close_to_unbucketed(noise_only, mean_tolerance):
+    """
+    Bucketing resamples the image twice, so features drift from the
+    unbucketed path. Measured in fractions of the pixel range, the mean
+    absolute difference stays below 3% for detailed images and below 6%
+    for pure noise, the worst case for resampling.
+    """
+    # GIVEN
+    # processor settings of the deployed google/vit-base-patch16-384
+    feature_extractor = ViTImageProcessor(size={"height": 384, "width": 384})
+    # one unit of the pixel range in feature space
+    pixel_range = (
+        feature_extractor.rescale_factor / feature_extractor.image_std[0]
+    )
+    bucketed_config = {"buckets": BUCKETS}
+    rng = np.random.default_rng(0)
+
+    def features(numpy_image):
+        output = torch.empty((1, 3, 384, 384))
+        execute_feature_extractor_into(
+            feature_extractor, torch.from_numpy(numpy_image), output
+        )
+        return output
+
+    for width, height in [(640, 480), (1280, 720), (300, 500), (1920, 1080)]:
+        image = _high_detail_image(width, height, rng, noise_only)
+
+        # WITH
+        difference = (
+            features(_preprocess_image(image, bucketed_config))
+            - features(_preprocess_image(image))
+        ).abs() / pixel_range
+
+        # THEN
+        assert difference.mean() < mean_tolerance
+
+
+def _scene_image(width, height, rng):
+    """Photo-like image: shaded background, overlapping shapes, sensor noise."""
+    corners = rng.random((2, 2, 3)) * 255
+    image = Image.fromarray(corners.astype(np.uint8)).resize(
+        (width, height), Image.Resampling.BILINEAR
+    )
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.integers(5, 25)):
+        x0, x1 = sorted(rng.integers(0, width, 2))
+        y0, y1 = sorted(rng.integers(0, height, 2))
+        shape = draw.ellipse if rng.random() < 0.5 else draw.rectangle
+        shape((x0, y0, x1, y1), fill=tuple(rng.integers(0, 256, 3).tolist()))
+    pixels = np.asarray(image, dtype=np.float64)
+    pixels += rng.normal(0, 8, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _features(feature_extractor, image, config=None) -> torch.Tensor:
+    features = torch.empty((1, 3, 384, 384))
+    execute_feature_extractor_into(
+        feature_extractor,
+        torch.from_numpy(_preprocess_image(image, config)),
+        features,
+    )
+    return features
+
+
+def _descriptors(features: torch.Tensor) -> torch.Tensor:
+    """Unit-length 4x4 layout of the normalized features of each image."""
+    features = torch.nn.functional.instance_norm(features)
+    pooled = torch.nn.functional.adaptive_avg_pool2d(features, 4).flatten(1)
+    return torch.nn.functional.normalize(pooled, dim=1)
+
+
+def test_bucketed_predictions_agree_with_unbucketed():
+    """
+    Bucketed and unbucketed requests predict the same class for at least
+    95% of photo-like images of common aspect ratios (96 of 96 when written).
+
+    The classifier is fixed: it predicts the most similar of 7 reference
+    images, comparing the layout of the normalized features, so it reacts to
+    image content despite the near-constant features of the deployed
+    processor settings.
+    """
+    # GIVEN
+    feature_extractor = ViTImageProcessor(size={"height": 384, "width": 384})
+    num_classes = 7
+    reference_rng = np.random.default_rng(101)
+    references = _descriptors(
+        torch.cat(
+            [
+                _features(
+                    feature_extractor, _scene_image(640, 480, reference_rng)
+                )
+                for _ in range(num_classes)
+            ]
+        )
+    )
+    sizes = [
+        (640, 480),
+        (1280, 720),
+        (1024, 768),
+        (480, 640),
+        (720, 1280),
+        (600, 400),
+        (500, 500),
+        (1920, 1080),
+    ]
+    rng = np.random.default_rng(0)
+    images = [_scene_image(*sizes[idx % len(sizes)], rng) for idx in range(96)]
+
+    def classify(features: torch.Tensor) -> int:
+        return int((_descriptors(features) @ references.T).argmax())
+
+    # WITH
+    predictions = [
+        (
+            classify(_features(feature_extractor, image)),
+            classify(
+                _features(feature_extractor, image, {"buckets": BUCKETS})
+            ),
+        )
+        for image in images
+    ]
+
+    # THEN
+    unbucketed, bucketed = np.array(predictions).T
+    # the classifier separates the images, agreement is not trivial
+    assert len(set(unbucketed)) == num_classes
+    assert np.mean(unbucketed == bucketed) >= 0.95
+
+
+def test_bucketed_features_match_unbucketed_for_bucket_sized_images():
+    # GIVEN
+    feature_extractor = ViTImageProcessor(size={"height": 384, "width": 384})
+    image = _high_detail_image(384, 384, np.random.default_rng(0), True)
+
+    # WITH
+    features = torch.empty((2, 3, 384, 384))
+    execute_feature_extractor_into(
+        feature_extractor,
+        torch.from_numpy(
+            np.stack(
+                [
+                    _preprocess_image(image),
+                    _preprocess_image(image, {"buckets": BUCKETS}),
+                ]
+            )
+        ),
+        features,
+    )
+
+    # THEN
+    torch.testing.assert_close(features[1], features[0], atol=0, rtol=0)
@@ -2,12 +2,21 @@ import json
 from pathlib import Path
 from unittest.mock import Mock
 
+import numpy as np
 import pytest
+import torch
 from click.testing import CliRunner
+from transformers import ViTImageProcessor
 
 # Import the functions and CLI
 from imageclassifier import create_model_repository, pbtxt_generator
-from imageclassifier.model_repository_cli import generate_ensemble_config
+from imageclassifier.features.image_preprocessor import (
+    execute_feature_extractor_into,
+)
+from imageclassifier.model_repository_cli import (
+    FusedImageClassifier,
+    generate_ensemble_config,
+)
 
 
 # Define a fixture for the CliRunner
@@ -240,3 +249,189 @@ def test_download_model_command_success(
         in result.output
     )
     mock_torch_save.assert_called_once()
+
+
+def test_download_model_command_fused(
+    monkeypatch,
+    runner,
+    tmp_path: Path,
+):
+    # GIVEN
+    model_name = "fused_classifier"
+    source_model = "vit_base_patch16_384"
+    model_repository_path = tmp_path / "model_repository" / model_name / "1"
+    model_repository_path.mkdir(parents=True)
+
+    mock_create_model = Mock(return_value=Mock())
+    monkeypatch.setattr(
+        "imageclassifier.model_repository_cli.timm.create_model",
+        mock_create_model,
+    )
+    mock_traced_model = torch.nn.Identity()
+    monkeypatch.setattr(
+        "imageclassifier.model_repository_cli.torch.jit.trace",
+        Mock(return_value=mock_traced_model),
+    )
+    mock_script = Mock()
+    monkeypatch.setattr(
+        "imageclassifier.model_repository_cli.torch.jit.script", mock_script
+    )
+    mock_torch_save = Mock()
+    monkeypatch.setattr(
+        "imageclassifier.model_repository_cli.torch.jit.save", mock_torch_save
+    )
+
+    # WITH
+    result = runner.invoke(
+        pbtxt_generator,
+        [
+            "download-model",
+            model_name,
+            "--fused",
+            "--source-model",
+            source_model,
+            "--base-path",
+            str(tmp_path / "model_repository"),
+        ],
+    )
+
+    # THEN
+    assert result.exit_code == 0
+    assert "Successfully downloaded model" in result.output
+    mock_create_model.assert_called_once_with(
+        source_model, pretrained=True, num_classes=7
+    )
+    fused_model = mock_script.call_args.args[0]
+    assert isinstance(fused_model, FusedImageClassifier)
+    assert fused_model.model is mock_traced_model
+    mock_torch_save.assert_called_once_with(
+        mock_script.return_value, model_repository_path / "model.pt"
+    )
+
+
+def test_fused_image_classifier_matches_vit_processor():
+    # GIVEN
+    processor = ViTImageProcessor(size={"height": 384, "width": 384})
+    fused_model = torch.jit.script(FusedImageClassifier(torch.nn.Identity()))
+    image = np.random.rand(3, 200, 300).astype("float32")
+
+    # WITH
+    expected = processor(images=image, return_tensors="pt").pixel_values
+    actual = fused_model(torch.from_numpy(image))
+
+    # THEN
+    assert actual.shape == (1, 3, 384, 384)
+    torch.testing.assert_close(actual, expected, atol=1e-5, rtol=0)
+    assert fused_model(torch.rand(2, 3, 64, 48)).shape == (2, 3, 384, 384)
+
+
+def test_create_model_repository_batchable_config(tmp_path: Path):
+    # GIVEN
+    config = {
+        "max_batch_size": 8,
+        "input": {
+            "name": "image_preprocessor_input",
+            "data_type": "TYPE_FP32",
+            "dims": [3, -1, -1],
+        },
+        "output": {
+            "name": "image_preprocessor_output",
+            "data_type": "TYPE_FP32",
+            "dims": [3, 384, 384],
+        },
+        "dynamic_batching": {
+            "preferred_batch_size": [4, 8],
+            "max_queue_delay_microseconds": 500,
+        },
+    }
+
+    # WITH
+    create_model_repository(
+        "image_preprocessor", 1, "python", config, base_path=str(tmp_path)
+    )
+
+    # THEN
+    config_content = (
+        tmp_path / "image_preprocessor" / "config.pbtxt"
+    ).read_text()
+    assert 'backend: "python"\nmax_batch_size: 8\ninput [' in config_content
+    assert config_content.endswith(
+        "dynamic_batching {\n"
+        "  preferred_batch_size: [4, 8]\n"
+        "  max_queue_delay_microseconds: 500\n"
+        "}\n"
+    )
+
+
+def test_fused_image_classifier_matches_preprocessor_backend():
+    # GIVEN
+    processor = ViTImageProcessor(size={"height": 384, "width": 384})
+    fused_model = torch.jit.script(FusedImageClassifier(torch.nn.Identity()))
+    image = torch.rand(3, 480, 640)
+
+    # WITH
+    expected = execute_feature_extractor_into(
+        processor, image, torch.empty((1, 3, 384, 384))
+    )
+    actual = fused_model(image)
+
+    # THEN
+    torch.testing.assert_close(actual, expected, atol=0, rtol=0)
+
+
+def test_create_model_repository_formats_nested_dynamic_batching(
+    tmp_path: Path,
+):
+    # GIVEN
+    config = {
+        "max_batch_size": 8,
+        "input": {"name": "in", "data_type": "TYPE_FP32", "dims": [3]},
+        "output": {"name": "out", "data_type": "TYPE_FP32", "dims": [7]},
+        "dynamic_batching": {
+            "preserve_ordering": True,
+            "default_queue_policy": {
+                "timeout_action": "REJECT",
+                "allow_timeout_override": False,
+                "max_queue_size": 16,
+            },
+        },
+    }
+
+    # WITH
+    create_model_repository("model", 1, "python", config, str(tmp_path))
+
+    # THEN
+    config_content = (tmp_path / "model" / "config.pbtxt").read_text()
+    assert config_content.endswith(
+        "dynamic_batching {\n"
+        "  preserve_ordering: true\n"
+        "  default_queue_policy {\n"
+        "    timeout_action: REJECT\n"
+        "    allow_timeout_override: false\n"
+        "    max_queue_size: 16\n"
+        "  }\n"
+        "}\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "dynamic_batching",
+    [
+        {"priority_queue_policy": {1: {"max_queue_size": 4}}},
+        {"preferred_batch_size": [{"size": 4}]},
+        {"timeout_action": "not an enum"},
+        {"max_queue_delay_microseconds": None},
+    ],
+)
+def test_create_model_repository_rejects_unsupported_values(
+    tmp_path: Path, dynamic_batching
+):
+    config = {
+        "max_batch_size": 8,
+        "input": {"name": "in", "data_type": "TYPE_FP32", "dims": [3]},
+        "output": {"name": "out", "data_type": "TYPE_FP32", "dims": [7]},
+        "dynamic_batching": dynamic_batching,
+    }
+
+    with pytest.raises(ValueError, match="Unsupported"):
+        create_model_repository("model", 1, "python", config, str(tmp_path))
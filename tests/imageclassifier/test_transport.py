@@ -0,0 +1,317 @@
+from concurrent import futures
+from unittest.mock import patch
+
+import grpc
+import numpy as np
+import pytest
+from PIL import Image
+from tritonclient.grpc import model_config_pb2, service_pb2, service_pb2_grpc
+
+from imageclassifier import MicroBatcher, run_inference, stream_inference
+from imageclassifier.transport import (
+    GrpcTransport,
+    HttpTransport,
+    InferenceTransport,
+    TransportPool,
+    create_transport,
+)
+
+CLASSES = [
+    "house",
+    "tree",
+    "bunny",
+    "turtle",
+    "storm",
+    "record-player",
+    "ron-howard",
+]
+MODELS = {
+    "ensemble_model": {
+        "input": "input_image",
+        "output": "probabilities_output",
+    },
+}
+
+
+class KServeStandIn(service_pb2_grpc.GRPCInferenceServiceServicer):
+    """
+    In-process KServe v2 inference service.
+
+    Predicts the class from the image brightness, so each request gets a
+    distinguishable answer.
+    """
+
+    def __init__(self):
+        self.infer_requests = []
+        self.stream_requests = []
+
+    def _infer(self, request):
+        (tensor,) = request.inputs
+        data = np.frombuffer(
+            request.raw_input_contents[0], dtype=np.float32
+        ).reshape(tensor.shape)
+        images = data if data.ndim == 4 else data[np.newaxis]
+        brightness = images.mean(axis=(1, 2, 3))
+        probabilities = np.zeros((len(images), len(CLASSES)), np.float32)
+        probabilities[
+            np.arange(len(images)), np.rint(brightness * 6).astype(int)
+        ] = 1
+
+        response = service_pb2.ModelInferResponse(
+            model_name=request.model_name, id=request.id
+        )
+        output = response.outputs.add()
+        output.name = "probabilities_output"
+        output.datatype = "FP32"
+        output.shape.extend(probabilities.shape)
+        response.raw_output_contents.append(probabilities.tobytes())
+        return response
+
+    def ModelConfig(self, request, context):
+        return service_pb2.ModelConfigResponse(
+            config=model_config_pb2.ModelConfig(
+                name=request.name, max_batch_size=8
+            )
+        )
+
+    def ModelInfer(self, request, context):
+        self.infer_requests.append(request)
+        return self._infer(request)
+
+    def ModelStreamInfer(self, request_iterator, context):
+        for request in request_iterator:
+            self.stream_requests.append(request)
+            yield service_pb2.ModelStreamInferResponse(
+                infer_response=self._infer(request)
+            )
+
+
+@pytest.fixture
+def kserve_server():
+    servicer = KServeStandIn()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(
+        servicer, server
+    )
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    yield f"localhost:{port}", servicer
+    server.stop(grace=None)
+
+
+def _image(class_index: int) -> Image.Image:
+    value = round(class_index / 6 * 255)
+    return Image.new("RGB", (32, 24), color=(value, value, value))
+
+
+def test_run_inference_over_grpc(kserve_server):
+    # GIVEN
+    server_url, servicer = kserve_server
+
+    # WITH
+    result = run_inference(
+        image=_image(3),
+        model_name="ensemble_model",
+        classes=CLASSES,
+        models=MODELS,
+        server_url=server_url,
+        protocol="grpc",
+    )
+
+    # THEN
+    assert result == (3, "turtle")
+    (request,) = servicer.infer_requests
+    assert request.model_name == "ensemble_model"
+    assert request.inputs[0].name == "input_image"
+    assert list(request.inputs[0].shape) == [3, 24, 32]
+    # tensors travel as raw bytes, not typed protobuf contents
+    assert len(request.raw_input_contents[0]) == 3 * 24 * 32 * 4
+    assert not request.inputs[0].HasField("contents")
+
+
+def test_stream_inference_over_grpc(kserve_server):
+    # GIVEN
+    server_url, servicer = kserve_server
+    class_indices = [1, 5, 0, 6, 2]
+
+    # WITH
+    results = list(
+        stream_inference(
+            images=[_image(idx) for idx in class_indices],
+            model_name="ensemble_model",
+            classes=CLASSES,
+            models=MODELS,
+            server_url=server_url,
+            protocol="grpc",
+        )
+    )
+
+    # THEN
+    assert results == [(idx, CLASSES[idx]) for idx in class_indices]
+    assert len(servicer.stream_requests) == len(class_indices)
+    assert not servicer.infer_requests
+
+
+def test_micro_batcher_over_grpc(kserve_server):
+    # GIVEN
+    server_url, servicer = kserve_server
+
+    # WITH
+    with MicroBatcher(
+        "ensemble_model",
+        CLASSES,
+        MODELS,
+        server_url=server_url,
+        protocol="grpc",
+        max_batch_size=2,
+        max_wait_us=5_000_000,
+    ) as batcher:
+        batch = [batcher.submit(_image(idx)) for idx in (4, 2)]
+        results = [future.result(timeout=5) for future in batch]
+
+    # THEN
+    assert results == [(4, "storm"), (2, "bunny")]
+    (request,) = servicer.infer_requests
+    assert list(request.inputs[0].shape) == [2, 3, 24, 32]
+
+
+def test_http_stream_infer_sends_sequential_requests():
+    # GIVEN
+    with patch(
+        "imageclassifier.transport.httpclient.InferenceServerClient",
+        autospec=True,
+    ) as mock_client:
+        mock_client.return_value.infer.return_value.as_numpy.return_value = (
+            np.ones((1, 7))
+        )
+        tensors = [np.zeros((3, 8, 8), np.float32) for _ in range(3)]
+
+        # WITH
+        with HttpTransport("localhost:8000") as transport:
+            outputs = list(
+                transport.stream_infer(
+                    "ensemble_model", "input_image", tensors, "probabilities"
+                )
+            )
+
+    # THEN
+    assert len(outputs) == 3
+    assert mock_client.return_value.infer.call_count == 3
+    mock_client.return_value.close.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "protocol, transport_class, server_url",
+    [
+        ("http", HttpTransport, "localhost:8000"),
+        ("grpc", GrpcTransport, "localhost:8001"),
+    ],
+)
+def test_create_transport_defaults(protocol, transport_class, server_url):
+    with patch.object(
+        transport_class, "__init__", return_value=None
+    ) as mock_init:
+        transport = create_transport(protocol)
+
+    assert isinstance(transport, transport_class)
+    mock_init.assert_called_once_with(server_url)
+
+
+def test_create_transport_rejects_unknown_protocol():
+    with pytest.raises(ValueError, match="Unsupported protocol"):
+        create_transport("websocket")
+
+
+def test_transport_pool_reuses_connections(kserve_server):
+    # GIVEN
+    server_url, servicer = kserve_server
+    pool = TransportPool(protocol="grpc", server_url=server_url, max_size=2)
+
+    # WITH
+    with patch(
+        "imageclassifier.transport.create_transport",
+        side_effect=create_transport,
+    ) as mock_create_transport:
+        for idx in (1, 2, 3):
+            with pool.acquire() as transport:
+                result = list(
+                    stream_inference(
+                        [_image(idx)],
+                        model_name="ensemble_model",
+                        classes=CLASSES,
+                        models=MODELS,
+                        transport=transport,
+                    )
+                )
+            assert result == [(idx, CLASSES[idx])]
+    pool.close()
+
+    # THEN
+    mock_create_transport.assert_called_once_with("grpc", server_url)
+    assert len(servicer.stream_requests) == 3
+
+
+def test_transport_pool_discards_failed_transports():
+    # GIVEN
+    pool = TransportPool(max_size=1)
+
+    with patch(
+        "imageclassifier.transport.create_transport"
+    ) as mock_create_transport:
+        # WITH
+        with pytest.raises(RuntimeError):
+            with pool.acquire():
+                raise RuntimeError("connection reset")
+        with pool.acquire() as transport:
+            pass
+
+    # THEN
+    assert mock_create_transport.call_count == 2
+    mock_create_transport.return_value.close.assert_called_once()
+    assert transport is mock_create_transport.return_value
+
+
+def test_inference_transport_is_abstract():
+    class IncompleteTransport(InferenceTransport):
+        def close(self):
+            pass
+
+    with pytest.raises(TypeError, match="infer"):
+        IncompleteTransport()
+
+
+def test_micro_batcher_rejects_unknown_protocol():
+    with pytest.raises(ValueError, match="Unsupported protocol"):
+        MicroBatcher("ensemble_model", CLASSES, MODELS, protocol="websocket")
+
+
+def test_grpc_stream_infer_yields_while_sending(kserve_server):
+    # GIVEN
+    server_url, servicer = kserve_server
+    consumed = []
+
+    def tensors():
+        for idx in range(6):
+            consumed.append(idx)
+            yield np.full((3, 8, 8), idx / 6, dtype=np.float32)
+
+    # WITH
+    with GrpcTransport(server_url, max_in_flight=2) as transport:
+        stream = transport.stream_infer(
+            "ensemble_model", "input_image", tensors(), "probabilities_output"
+        )
+        first = next(stream)
+        consumed_at_first_result = len(consumed)
+        rest = list(stream)
+
+    # THEN
+    # at most max_in_flight requests are sent ahead of the first result
+    assert consumed_at_first_result <= 3
+    predictions = [output.argmax() for output in [first, *rest]]
+    assert predictions == list(range(6))
+    assert len(servicer.stream_requests) == 6
+
+
+def test_grpc_transport_rejects_invalid_max_in_flight():
+    with pytest.raises(ValueError, match="max_in_flight"):
+        GrpcTransport("localhost:8001", max_in_flight=0)